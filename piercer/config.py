@@ -5,12 +5,12 @@ Application Configuration
 """
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Settings:
-    """应用配置"""
+    """应用配置 (只读，需要修改时使用 dataclasses.replace 生成新实例)"""
     
     # WireGuard 配置文件路径
     wg_config_path: str = os.getenv("PIERCER_WG_CONFIG", "/etc/wireguard/wg0.conf")
@@ -21,9 +21,15 @@ class Settings:
     # 服务器 Endpoint (供客户端连接) - 必须通过环境变量配置
     server_endpoint: str = os.getenv("PIERCER_SERVER_ENDPOINT", "")
     
+    # 是否使用行扫描快速提取 proxy-providers (无法识别时自动回退到完整 YAML 解析)
+    clash_fast_parse: bool = os.getenv("PIERCER_CLASH_FAST_PARSE", "true").lower() == "true"
+    
     # 是否启用 WireGuard 热重载
     enable_wg_reload: bool = os.getenv("PIERCER_ENABLE_WG_RELOAD", "false").lower() == "true"
     
+    # 是否通过 netlink 读取 WireGuard 运行时状态 (需要安装 pyroute2，否则回退到 wg 命令)
+    wg_use_netlink: bool = os.getenv("PIERCER_WG_NETLINK", "false").lower() == "true"
+    
     # DNS 服务器监听地址
     dns_listen_address: str = os.getenv("PIERCER_DNS_LISTEN", "10.8.0.1")
     dns_listen_port: int = int(os.getenv("PIERCER_DNS_PORT", "53"))
@@ -35,9 +41,15 @@ class Settings:
     api_host: str = os.getenv("PIERCER_API_HOST", "10.8.0.1")
     api_port: int = int(os.getenv("PIERCER_API_PORT", "8000"))
     
+    # 预先去除空白的 server_endpoint
+    _server_endpoint_stripped: str = field(init=False, repr=False, compare=False, default="")
+    
+    def __post_init__(self):
+        object.__setattr__(self, "_server_endpoint_stripped", self.server_endpoint.strip())
+    
     def is_server_endpoint_configured(self) -> bool:
         """检查服务器 Endpoint 是否已配置"""
-        return bool(self.server_endpoint and self.server_endpoint.strip())
+        return bool(self._server_endpoint_stripped)
 
 
 # 全局配置实例
@@ -4,19 +4,49 @@ Clash Configuration Parser
 解析 Clash 配置文件，提取订阅状态信息。
 """
 
+import os
 import re
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import attrgetter
 from datetime import date, datetime
 from pathlib import Path
-from typing import Optional
+from types import MappingProxyType
+from typing import Mapping, Optional
 
-import yaml
+from .fileio import write_atomic
 
 # 匹配 proxy-provider key 中的日期: name-YYYY-MM-DD
+# (parse_subscription_date 使用等价的字符串切片实现，此模式作为参照保留)
 DATE_PATTERN = re.compile(r"^(.+)-(\d{4})-(\d{2})-(\d{2})$")
 
+# 状态排序权重: expired > expiring > active > unknown
+_STATUS_RANK = {"expired": 0, "expiring": 1, "active": 2, "unknown": 3}
 
-@dataclass
+# 已解析 YAML 的缓存: path -> (st_mtime_ns, st_size, config)
+_YAML_CACHE: dict[str, tuple[int, int, Mapping]] = {}
+
+# 快速扫描 proxy-providers 的缓存: path -> (st_mtime_ns, st_size, providers 或 None)
+_PROVIDERS_CACHE: dict[str, tuple[int, int, Optional[dict]]] = {}
+
+# 顶层 proxy-providers 键所在行
+_PROVIDERS_LINE = re.compile(r"^proxy-providers:[ \t]*(?:#.*)?$", re.MULTILINE)
+
+# 映射键行: 普通 / 双引号 / 单引号 key，允许行尾注释
+_KEY_LINE = re.compile(
+    r"""^(?:"(?P<dq>[^"\\]*)"|'(?P<sq>(?:[^']|'')*)'|(?P<plain>[^\s'"#&*!|>%@`{\[\]},?-][^#]*?|-[^\s#][^#]*?))"""
+    r"""[ \t]*:(?P<value>(?:[ \t]+.*)?)$"""
+)
+
+# 会被 YAML 解析为非字符串的普通标量 (出现时交由完整解析器处理)
+_PLAIN_NON_STR = re.compile(
+    r"^(?:[-+.0-9_:]+|~|null|true|false|yes|no|on|off|y|n|\.inf|-\.inf|\.nan|<<)$",
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True, slots=True)
 class SubscriptionInfo:
     """订阅信息"""
     key: str
@@ -25,13 +55,21 @@ class SubscriptionInfo:
     days_remaining: Optional[int]
     status: str  # "active", "expiring", "expired", "unknown"
     url: Optional[str] = None
+    # 排序键: (状态权重, 剩余天数)，构造时计算
+    rank: tuple[int, int] = field(default=(4, sys.maxsize), repr=False, compare=False)
 
 
 class ClashParser:
     """Clash 配置文件解析器"""
     
-    def __init__(self, config_path: str = "data/uploaded_clash.yaml"):
+    # PyYAML 在首次完整解析时才导入 (快速路径与仅读写文件的接口无需加载)
+    _yaml = None
+    _yaml_loader = None
+    
+    def __init__(self, config_path: str = "data/uploaded_clash.yaml", fast_providers: bool = True):
         self.config_path = Path(config_path)
+        # 是否使用行扫描提取 proxy-providers (无法识别时自动回退到完整 YAML 解析)
+        self.fast_providers = fast_providers
     
     def exists(self) -> bool:
         """检查配置文件是否存在"""
@@ -47,18 +85,150 @@ class ClashParser:
         """写入配置文件"""
         # 确保目录存在
         self.config_path.parent.mkdir(parents=True, exist_ok=True)
-        self.config_path.write_text(content, encoding="utf-8")
+        if write_atomic(self.config_path, content.encode("utf-8")):
+            _YAML_CACHE.pop(str(self.config_path), None)
+            _PROVIDERS_CACHE.pop(str(self.config_path), None)
+            _summary_cached.cache_clear()
     
-    def parse_yaml(self) -> dict:
-        """解析 YAML 配置"""
+    def parse_yaml(self) -> Mapping:
+        """
+        解析 YAML 配置
+        
+        按 (mtime, size) 缓存解析结果，文件未变化时直接复用。
+        返回只读映射，避免调用方意外修改共享的缓存对象。
+        """
+        key = str(self.config_path)
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"配置文件不存在: {self.config_path}")
+        
+        cached = _YAML_CACHE.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        
         content = self.read_config()
-        return yaml.safe_load(content)
+        config = self._load_yaml(content)
+        if isinstance(config, dict):
+            config = MappingProxyType(config)
+        _YAML_CACHE[key] = (st.st_mtime_ns, st.st_size, config)
+        return config
+    
+    @classmethod
+    def _load_yaml(cls, content: str):
+        """使用 SafeLoader 解析 YAML (优先使用 libyaml 的 C 实现)"""
+        if cls._yaml is None:
+            import yaml
+            cls._yaml_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            cls._yaml = yaml
+        return cls._yaml.load(content, Loader=cls._yaml_loader)
     
     def get_proxy_providers(self) -> dict:
         """获取 proxy-providers 配置"""
+        if self.fast_providers:
+            providers = self._scan_providers_cached()
+            if providers is not None:
+                return providers
+        
         config = self.parse_yaml()
         return config.get("proxy-providers", {})
     
+    def _scan_providers_cached(self) -> Optional[dict]:
+        """按 (mtime, size) 缓存的 _fast_providers 结果"""
+        key = str(self.config_path)
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"配置文件不存在: {self.config_path}")
+        
+        cached = _PROVIDERS_CACHE.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        
+        providers = self._fast_providers(self.read_config())
+        _PROVIDERS_CACHE[key] = (st.st_mtime_ns, st.st_size, providers)
+        return providers
+    
+    @staticmethod
+    def _fast_providers(text: str) -> Optional[dict[str, Optional[dict]]]:
+        """
+        行扫描提取 proxy-providers 的 key 及其 url，跳过其余配置的解析
+        
+        仅识别块风格的常规写法；遇到锚点、合并键、流式集合、多行标量等
+        无法确定结果的写法时返回 None，由调用方回退到完整 YAML 解析。
+        """
+        matches = list(_PROVIDERS_LINE.finditer(text))
+        if len(matches) != 1:
+            return None
+        
+        providers: dict[str, Optional[dict]] = {}
+        child_indent = None
+        field_indent = None
+        current = None
+        nested_allowed = False
+        
+        for line in text[matches[0].end():].splitlines()[1:]:
+            body = line.lstrip(" ")
+            if not body or body.startswith("#") or not body.strip():
+                continue
+            if body[0] == "\t":
+                return None
+            
+            indent = len(line) - len(body)
+            if indent == 0:
+                break
+            body = body.rstrip()
+            
+            if child_indent is None:
+                child_indent = indent
+            if indent < child_indent:
+                return None
+            
+            if indent == child_indent:
+                # provider 名称行
+                key_match = _KEY_LINE.match(body)
+                if key_match is None or _scalar_text(key_match.group("value").strip()) is not None:
+                    return None
+                key = _key_text(key_match)
+                if key is None or key in providers:
+                    return None
+                providers[key] = None
+                current = key
+                field_indent = None
+                continue
+            
+            if field_indent is None:
+                field_indent = indent
+            if indent < field_indent:
+                return None
+            if indent > field_indent:
+                # 字段下的嵌套块 (如 health-check)，仅允许出现在空值字段之后
+                if not nested_allowed:
+                    return None
+                continue
+            
+            # provider 的字段行
+            field_match = _KEY_LINE.match(body)
+            if field_match is None:
+                return None
+            field = _key_text(field_match)
+            if field is None:
+                return None
+            
+            value = field_match.group("value").strip()
+            nested_allowed = value == "" or value.startswith("#")
+            if providers[current] is None:
+                providers[current] = {}
+            if field == "url":
+                url = _scalar_text(value)
+                if url is _INVALID:
+                    return None
+                providers[current]["url"] = url
+        
+        if not providers:
+            return None
+        return providers
+    
     def parse_subscription_date(self, key: str) -> tuple[str, Optional[date]]:
         """
         从 key 中解析订阅名称和过期日期
@@ -66,18 +236,18 @@ class ClashParser:
         格式: name-YYYY-MM-DD
         返回: (name, expire_date) 或 (key, None)
         """
-        match = DATE_PATTERN.match(key)
-        if match:
-            name = match.group(1)
-            year = int(match.group(2))
-            month = int(match.group(3))
-            day = int(match.group(4))
-            try:
-                expire_date = date(year, month, day)
-                return name, expire_date
-            except ValueError:
-                pass
-        return key, None
+        # 与 DATE_PATTERN 等价的切片判断: 末尾 11 个字符为 "-YYYY-MM-DD"
+        if len(key) < 12 or key[-11] != "-" or key[-6] != "-" or key[-3] != "-":
+            return key, None
+        
+        year, month, day = key[-10:-6], key[-5:-3], key[-2:]
+        if not (year.isdecimal() and month.isdecimal() and day.isdecimal()):
+            return key, None
+        
+        try:
+            return key[:-11], date(int(year), int(month), int(day))
+        except ValueError:
+            return key, None
     
     def calculate_status(self, expire_date: Optional[date], today: Optional[date] = None) -> tuple[Optional[int], str]:
         """
@@ -127,18 +297,39 @@ class ClashParser:
                 days_remaining=days_remaining,
                 status=status,
                 url=url,
+                rank=(
+                    _STATUS_RANK.get(status, 4),
+                    days_remaining if days_remaining is not None else sys.maxsize,
+                ),
             )
             subscriptions.append(info)
         
-        # 按状态排序: expired > expiring > active > unknown
-        status_order = {"expired": 0, "expiring": 1, "active": 2, "unknown": 3}
-        subscriptions.sort(key=lambda x: (status_order.get(x.status, 4), x.days_remaining or 999))
+        # 按状态排序: expired > expiring > active > unknown，同状态按剩余天数
+        subscriptions.sort(key=attrgetter("rank"))
         
         return subscriptions
     
     def get_status_summary(self, today: Optional[date] = None) -> dict:
         """
-        获取订阅状态汇总
+        获取订阅状态汇总 (按文件版本与日期缓存)
+        
+        返回的 dict 在相同 (mtime, size, today) 下被共享，调用方不应修改。
+        """
+        if today is None:
+            today = date.today()
+        
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return self.build_status_summary(today)
+        
+        return _summary_cached(
+            str(self.config_path), self.fast_providers, st.st_mtime_ns, st.st_size, today.isoformat()
+        )
+    
+    def build_status_summary(self, today: Optional[date] = None) -> dict:
+        """
+        构建订阅状态汇总
         
         返回格式:
         {
@@ -171,3 +362,59 @@ class ClashParser:
         }
         
         return summary
+
+
+@lru_cache(maxsize=8)
+def _summary_cached(path: str, fast_providers: bool, mtime_ns: int, size: int, today_iso: str) -> dict:
+    """按文件版本与日期缓存的订阅汇总 (today 显式传入，跨天自动失效)"""
+    parser = ClashParser(path, fast_providers=fast_providers)
+    return parser.build_status_summary(date.fromisoformat(today_iso))
+
+
+# _scalar_text 无法确定结果时的标记
+_INVALID = object()
+
+
+def _key_text(match: re.Match) -> Optional[str]:
+    """提取映射键文本 (会被解析为非字符串的普通键返回 None)"""
+    if match.group("dq") is not None:
+        return match.group("dq")
+    if match.group("sq") is not None:
+        return match.group("sq").replace("''", "'")
+    
+    key = match.group("plain").rstrip()
+    if ": " in key or _PLAIN_NON_STR.match(key):
+        return None
+    return key
+
+
+def _scalar_text(value: str):
+    """解析单行标量值 (空值返回 None，无法确定时返回 _INVALID)"""
+    if value == "" or value.startswith("#"):
+        return None
+    
+    if value[0] in "\"'":
+        quote = value[0]
+        end = value.find(quote, 1)
+        if quote == "'":
+            while end != -1 and value[end + 1:end + 2] == "'":
+                end = value.find(quote, end + 2)
+        if end == -1:
+            return _INVALID
+        text = value[1:end]
+        rest = value[end + 1:].strip()
+        if rest and not rest.startswith("#"):
+            return _INVALID
+        if quote == '"':
+            return _INVALID if "\\" in text else text
+        return text.replace("''", "'")
+    
+    if value[0] in "&*!|>{[%@`":
+        return _INVALID
+    
+    comment = value.find(" #")
+    if comment != -1:
+        value = value[:comment].rstrip()
+    if _PLAIN_NON_STR.match(value):
+        return _INVALID
+    return value
@@ -0,0 +1,154 @@
+"""
+File IO Helpers
+
+配置文件的原子写入与加锁追加。
+"""
+
+import os
+import stat
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Sequence, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _iov_max() -> int:
+    """单次 writev 的最大分段数 (查询不到或不限制时取 POSIX 保证的最小值 16)"""
+    try:
+        value = os.sysconf("SC_IOV_MAX")
+    except (AttributeError, ValueError, OSError):
+        return 16
+    return value if value > 0 else 16
+
+
+# Linux 上为 1024
+_IOV_MAX = _iov_max()
+
+
+def write_atomic(path: Path, data: Union[bytes, Sequence[bytes]]) -> bool:
+    """
+    原子写入文件 (临时文件 + os.replace)
+
+    data 可以是分段的 bytes 序列，各段通过 writev 一次写出，无需先拼接。
+    内容与现有文件一致时跳过写入。临时文件以 0o600 创建，写入前再改为原文件的权限位。
+    返回: 是否实际发生了写入
+    """
+    chunks = [data] if isinstance(data, (bytes, bytearray, memoryview)) else list(data)
+    size = sum(len(c) for c in chunks)
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+
+    if st is not None and st.st_size == size and path.read_bytes() == b"".join(chunks):
+        return False
+
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    # 以 0o600 创建，避免私钥写入期间临时文件对其他用户可读
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        try:
+            if st is not None and hasattr(os, "fchmod"):
+                os.fchmod(fd, stat.S_IMODE(st.st_mode))
+            _write_all(fd, chunks)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    _fsync_dir(path.parent)
+    return True
+
+
+def _write_all(fd: int, chunks: list) -> None:
+    """写出全部分段 (writev 可用时一次系统调用，处理部分写入)"""
+    views = [memoryview(c) for c in chunks if len(c)]
+    while views:
+        if hasattr(os, "writev"):
+            n = os.writev(fd, views[:_IOV_MAX])
+        else:
+            n = os.write(fd, views[0])
+        while n:
+            if n >= len(views[0]):
+                n -= len(views.pop(0))
+            else:
+                views[0] = views[0][n:]
+                n = 0
+
+
+@contextmanager
+def open_locked(path: Path) -> Iterator[BinaryIO]:
+    """
+    以只读方式打开已存在的文件并持有排他锁 (fcntl 不可用的平台不加锁)
+
+    用于 "读取 -> write_atomic 替换" 的改写流程：替换在持锁期间完成，
+    等待同一把锁的写入方会发现 inode 已变化并重新打开新文件。
+    文件不存在时抛出 FileNotFoundError。
+    """
+    fd = _open_locked_fd(path, os.O_RDONLY)
+    with open(fd, "rb") as f:
+        yield f
+
+
+@contextmanager
+def open_locked_append(path: Path) -> Iterator[BinaryIO]:
+    """
+    以追加模式打开已存在的文件并持有排他锁 (fcntl 不可用的平台不加锁)
+
+    文件位置初始在开头，可先读取现有内容；写入总是追加到末尾，退出时 fsync。
+    文件不存在时抛出 FileNotFoundError。
+    """
+    fd = _open_locked_fd(path, os.O_RDWR | os.O_APPEND)
+    with open(fd, "a+b", buffering=64 * 1024) as f:
+        f.seek(0)
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _open_locked_fd(path: Path, flags: int) -> int:
+    """
+    打开文件并加排他锁
+
+    加锁后重新 stat 路径：若文件已被 os.replace 换成新 inode (持锁方完成了原子改写)，
+    则放弃旧文件并重新打开，避免写入已脱离目录的孤儿文件。
+    """
+    while True:
+        fd = os.open(path, flags)
+        if fcntl is None:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            locked = os.fstat(fd)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+        except BaseException:
+            os.close(fd)
+            raise
+        if current is not None and (current.st_dev, current.st_ino) == (locked.st_dev, locked.st_ino):
+            return fd
+        os.close(fd)
+
+
+def _fsync_dir(directory: Path) -> None:
+    """持久化目录项 (rename 结果)，不支持的平台忽略"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
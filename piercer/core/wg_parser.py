@@ -4,39 +4,140 @@ WireGuard Configuration Parser
 解析和操作 wg0.conf 配置文件，支持元数据注释块。
 """
 
+import asyncio
+import base64
+import hashlib
 import re
 import subprocess
 import os
-from dataclasses import dataclass, field
+import queue
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Iterator, Optional, Union
 from ipaddress import IPv4Address, IPv4Network
 
-# 匹配模式：注释头 + Peer块内容 (直到下一个注释头或文件结束)
-# Group 1: Name, Group 2: Date, Group 3: Block Content
-PEER_PATTERN = re.compile(
-    r"^# =+\n# ClientName: (.+?)\n# AddedAt: (.+?)\n# =+\n\[Peer\]\n(.*?)(?=\n# =+|\Z)",
-    re.MULTILINE | re.DOTALL
-)
+from .fileio import open_locked, open_locked_append, write_atomic
 
-# 提取 Endpoint 的子模式 (在 Block Content 中查找)
-ENDPOINT_PATTERN = re.compile(r"Endpoint\s*=\s*(.+)")
+# 显式传入的配置内容: 解析全程基于 bytes，str 会先按 UTF-8 编码
+_Content = Union[str, bytes]
 
-# 提取 PublicKey
-PUBKEY_PATTERN = re.compile(r"PublicKey\s*=\s*(.+)")
+# 每个 Peer 元数据块都必然包含的标记，用于在正则前快速预检
+_PEER_MARKER = b"# ClientName:"
 
-# 提取 AllowedIPs
-ALLOWED_IPS_PATTERN = re.compile(r"AllowedIPs\s*=\s*(.+)")
+# Peer 块内的单行: 已知字段 (允许缩进) 写入对应命名组，其余行原样跳过
+_PEER_FIELD_LINE = (
+    rb"(?:[ \t]*PublicKey[ \t]*=[ \t]*(?P<pubkey>[^\n]+)"
+    rb"|[ \t]*AllowedIPs[ \t]*=[ \t]*(?P<ips>[^\n]+)"
+    rb"|[ \t]*PresharedKey[ \t]*=[ \t]*(?P<psk>[^\n]+)"
+    rb"|[ \t]*Endpoint[ \t]*=[ \t]*(?P<ep>[^\n]+)"
+    rb"|[^\n]*)"
+)
 
-# 提取 PresharedKey
-PRESHARED_KEY_PATTERN = re.compile(r"PresharedKey\s*=\s*(.+)")
+# Peer 块的终止行: 下一个注释头或任意 [Section] (解析与删除共用)
+_BLOCK_END = rb"# =|\["
+
+# 匹配模式：注释头 + Peer块内容 (直到下一个注释头、下一个 [Section] 或文件结束)
+# 一次扫描同时提取块内字段，字段顺序不限；bytes 模式
+# Group 1: Name, Group 2: Date, Group 3: Block Content
+PEER_PATTERN = re.compile(
+    rb"^# =+\n# ClientName: (?P<name>.+?)\n# AddedAt: (?P<added>.+?)\n# =+\n\[Peer\]\n"
+    rb"(?P<block>(?:(?<=\n)(?!" + _BLOCK_END + rb")" + _PEER_FIELD_LINE + rb"\n?)*)",
+    re.MULTILINE
+)
 
 # VPN 网段配置
 VPN_NETWORK = IPv4Network("10.8.0.0/24")
 SERVER_IP = IPv4Address("10.8.0.1")
 
+# VPN 网段 (/24) 的地址前缀，如 "10.8.0."
+_VPN_PREFIX = str(VPN_NETWORK.network_address).rsplit(".", 1)[0] + "."
 
-@dataclass
+# 网段内 AllowedIPs 行 (允许缩进，捕获 IP 末位)
+_ALLOWED_IP_LINE = (
+    rb"^[ \t]*AllowedIPs[ \t]*=[ \t]*"
+    + re.escape(_VPN_PREFIX.encode("ascii"))
+    + rb"(?P<octet>\d{1,3})\b"
+)
+
+# 直接从原文扫描网段内 AllowedIPs 的末位 (无需完整解析 Peer)
+_ALLOWED_IP_SCAN = re.compile(_ALLOWED_IP_LINE, re.MULTILINE)
+
+# 冲突检查: 一次扫描同时收集设备名与已占用的 IP 末位
+_CONFLICT_SCAN = re.compile(
+    rb"^# ClientName: (?P<name>.+)$|" + _ALLOWED_IP_LINE,
+    re.MULTILINE
+)
+
+# 网段基址 (整数) 与服务器 IP 在位图中对应的位
+_VPN_BASE = int(VPN_NETWORK.network_address)
+_SERVER_BIT = 1 << (int(SERVER_IP) - _VPN_BASE)
+
+# 可分配的末位 .2 ~ .254 (.0 网络地址, .1 服务器, .255 广播)
+_ALLOCATABLE_MASK = ((1 << 255) - 1) & ~0b11
+
+# Peer 索引缓存: blake2b(content) -> PeerIndex
+_PEER_INDEX_CACHE: dict[bytes, "PeerIndex"] = {}
+_PEER_INDEX_CACHE_MAX = 32
+
+# Peer 配置块模板，按 (是否有 PresharedKey, 是否有 Endpoint) 预先展开
+_PEER_BLOCK_HEAD = (
+    "\n"
+    "# ==========================================\n"
+    "# ClientName: {name}\n"
+    "# AddedAt: {added_at}\n"
+    "# ==========================================\n"
+    "[Peer]\n"
+    "PublicKey = {public_key}\n"
+    "AllowedIPs = {assigned_ip}/32"
+)
+_PEER_BLOCK_TEMPLATES = {
+    (False, False): _PEER_BLOCK_HEAD,
+    (True, False): _PEER_BLOCK_HEAD + "\nPresharedKey = {preshared_key}",
+    (False, True): _PEER_BLOCK_HEAD + "\nEndpoint = {endpoint}",
+    (True, True): _PEER_BLOCK_HEAD + "\nPresharedKey = {preshared_key}\nEndpoint = {endpoint}",
+}
+
+# 客户端配置模板
+_CLIENT_CONFIG_TEMPLATE = """[Interface]
+# === 请填写您生成的私钥 ===
+PrivateKey = <YOUR_PRIVATE_KEY>
+Address = {assigned_ip}/24
+
+[Peer]
+PublicKey = {server_public_key}
+# === 如果您生成了预共享密钥，请填写 ===
+# PresharedKey = <YOUR_PRESHARED_KEY>
+Endpoint = {server_endpoint}
+AllowedIPs = 10.8.0.0/24
+PersistentKeepalive = 25
+"""
+
+# 读取运行时状态的命令
+_WG_DUMP_CMD = ("wg", "show", "wg0", "dump")
+
+# 热重载请求队列，由单个后台线程消费 (首次请求时启动)
+_RELOAD_QUEUE: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+_reload_thread: Optional[threading.Thread] = None
+_reload_thread_lock = threading.Lock()
+
+# 合并该时间窗口内的多次重载请求，只触发一次 wg syncconf
+_RELOAD_DEBOUNCE_SECONDS = 0.2
+
+# get_peers_with_status 结果的缓存时间窗口 (秒)
+_STATUS_CACHE_SECONDS = 2
+
+# 进程内共享的 pyroute2 WireGuard 句柄 (首次使用时创建)，访问经锁串行化
+_nl_handle = None
+_nl_lock = threading.Lock()
+
+# 未设置的密钥在 netlink 中以全零表示
+_ZERO_KEY = base64.b64encode(bytes(32)).decode("ascii")
+
+
+@dataclass(frozen=True, slots=True)
 class WgPeer:
     """WireGuard Peer 数据模型"""
     name: str
@@ -51,6 +152,21 @@ class WgPeer:
     transfer_tx: Optional[int] = None
 
 
+@dataclass(frozen=True, slots=True)
+class PeerIndex:
+    """
+    一次解析得到的 Peer 列表及按列预先计算的查询结构
+    
+    缓存对象在多次调用间共享，调用方不应修改其中的列表与字典。
+    """
+    peers: list[WgPeer]
+    by_name: dict[str, WgPeer]
+    by_pubkey: dict[str, int]  # public_key -> peers 中的下标
+    endpoints: list[WgPeer]
+    # 已占用 IP 位图: 第 n 位为 1 表示 10.8.0.n 已被占用 (含无元数据的 Peer 与服务器 IP)
+    used_ips: int
+
+
 @dataclass
 class WgInterface:
     """WireGuard Interface 配置"""
@@ -71,8 +187,14 @@ class WgConfig:
 class WgParser:
     """WireGuard 配置文件解析器"""
     
-    def __init__(self, config_path: str = "/etc/wireguard/wg0.conf"):
+    def __init__(self, config_path: str = "/etc/wireguard/wg0.conf", use_netlink: bool = False):
         self.config_path = Path(config_path)
+        # 通过 netlink 直接读取运行时状态 (需要 pyroute2)，失败时回退到 wg 命令
+        self.use_netlink = use_netlink
+        # ((wg0.conf mtime_ns, 时间窗口编号), peers)
+        self._peers_cache: Optional[tuple[tuple[int, int], list[WgPeer]]] = None
+        # 按 wg0.conf 的 (mtime_ns, size) 缓存的派生结果: key -> (stat 键, 值)
+        self._cache: dict[str, tuple[tuple[int, int], Any]] = {}
     
     def read_config(self) -> str:
         """读取配置文件内容"""
@@ -80,84 +202,109 @@ class WgParser:
             raise FileNotFoundError(f"配置文件不存在: {self.config_path}")
         return self.config_path.read_text(encoding="utf-8")
     
-    def write_config(self, content: str) -> None:
-        """写入配置文件"""
-        self.config_path.write_text(content, encoding="utf-8")
+    def write_config(self, content: _Content) -> None:
+        """写入配置文件 (原子替换，内容未变化时跳过)"""
+        write_atomic(self.config_path, _as_bytes(content))
     
-    def parse_peers(self, content: Optional[str] = None) -> list[WgPeer]:
+    def parse_peers(self, content: Optional[_Content] = None) -> list[WgPeer]:
         """解析所有 Peer 配置"""
-        if content is None:
-            content = self.read_config()
+        # WgPeer 不可变，可直接共享缓存中的对象
+        return list(self.get_peer_index(content).peers)
+    
+    def get_peer_index(self, content: Optional[_Content] = None) -> PeerIndex:
+        """获取 Peer 索引 (按内容摘要缓存，返回的对象不可修改)"""
+        if content is not None:
+            return _parse_peer_index(_as_bytes(content))
+        return self._cached("peer_index", self._read_peer_index)
+    
+    def _read_peer_index(self) -> PeerIndex:
+        return _parse_peer_index(self._read_config_bytes())
+    
+    def _cached(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        按 wg0.conf 的 (mtime_ns, size) 缓存 fn() 的结果，文件变化后重新计算
         
-        peers = []
-        for match in PEER_PATTERN.finditer(content):
-            name = match.group(1).strip()
-            added_at = match.group(2).strip()
-            block = match.group(3)
-            
-            # 提取各字段
-            pubkey_match = PUBKEY_PATTERN.search(block)
-            allowed_ips_match = ALLOWED_IPS_PATTERN.search(block)
-            endpoint_match = ENDPOINT_PATTERN.search(block)
-            psk_match = PRESHARED_KEY_PATTERN.search(block)
-            
-            if pubkey_match and allowed_ips_match:
-                peer = WgPeer(
-                    name=name,
-                    public_key=pubkey_match.group(1).strip(),
-                    allowed_ips=allowed_ips_match.group(1).strip(),
-                    added_at=added_at,
-                    endpoint=endpoint_match.group(1).strip() if endpoint_match else None,
-                    preshared_key=psk_match.group(1).strip() if psk_match else None,
-                )
-                peers.append(peer)
+        fn 返回 None 时不缓存；配置文件不存在时直接调用 fn。
+        """
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return fn()
+        
+        stamp = (st.st_mtime_ns, st.st_size)
+        hit = self._cache.get(key)
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
         
-        return peers
+        value = fn()
+        if value is not None:
+            self._cache[key] = (stamp, value)
+        return value
     
-    def get_used_ips(self, content: Optional[str] = None) -> set[IPv4Address]:
-        """获取已使用的 IP 地址集合"""
-        peers = self.parse_peers(content)
-        used_ips = {SERVER_IP}  # 服务器 IP 始终被占用
+    def _read_config_bytes(self) -> bytes:
+        """
+        一次性读入配置文件 (仅数 KB)
         
-        for peer in peers:
-            # 从 AllowedIPs 提取 IP (格式: 10.8.0.x/32)
-            ip_str = peer.allowed_ips.split("/")[0]
-            try:
-                used_ips.add(IPv4Address(ip_str))
-            except ValueError:
-                continue
+        不使用 mmap: 文件被原地截断 (如 cat > wg0.conf) 时映射访问会触发 SIGBUS。
+        """
+        with open(self.config_path, "rb") as f:
+            return f.read()
+    
+    def get_used_ips(self, content: Optional[_Content] = None) -> int:
+        """
+        获取已使用的 IP 位图
         
-        return used_ips
+        第 n 位为 1 表示 10.8.0.n 已被占用 (服务器 IP 始终被占用)。
+        """
+        return self.get_peer_index(content).used_ips
     
-    def get_next_available_ip(self, content: Optional[str] = None) -> IPv4Address:
+    def get_next_available_ip(self, content: Optional[_Content] = None) -> IPv4Address:
         """计算下一个可用的 IP 地址"""
-        used_ips = self.get_used_ips(content)
-        
-        # 从 .2 开始分配 (.1 是服务器, .0 是网络地址, .255 是广播)
-        for i in range(2, 255):
-            candidate = IPv4Address(f"10.8.0.{i}")
-            if candidate not in used_ips:
-                return candidate
+        free = ~self.get_used_ips(content) & _ALLOCATABLE_MASK
+        if not free:
+            raise RuntimeError("IP 地址池已耗尽")
         
-        raise RuntimeError("IP 地址池已耗尽")
+        # 最低位的 1 即最小的空闲末位
+        octet = (free & -free).bit_length() - 1
+        return IPv4Address(_VPN_BASE | octet)
     
-    def check_ip_conflict(self, ip: str, content: Optional[str] = None) -> bool:
+    def check_ip_conflict(self, ip: str, content: Optional[_Content] = None) -> bool:
         """检查 IP 是否已被占用"""
-        try:
-            target_ip = IPv4Address(ip.split("/")[0])
-        except ValueError:
-            raise ValueError(f"无效的 IP 地址: {ip}")
+        octet = _vpn_octet(ip)
+        if octet is None:
+            return False
         
-        used_ips = self.get_used_ips(content)
-        return target_ip in used_ips
+        used = self.get_used_ips(content)
+        return bool((used >> octet) & 1)
     
-    def check_name_conflict(self, name: str, content: Optional[str] = None) -> bool:
+    def check_name_conflict(self, name: str, content: Optional[_Content] = None) -> bool:
         """检查名称是否已存在"""
-        peers = self.parse_peers(content)
-        return any(p.name == name for p in peers)
+        return name in self.get_peer_index(content).by_name
+    
+    def _netlink_messages(self, interface: str = "wg0") -> Optional[list]:
+        """通过 netlink 获取接口信息 (返回全部 dump 消息，不可用时返回 None)"""
+        try:
+            return _netlink_dump(interface) or None
+        except ImportError:
+            self.use_netlink = False
+            return None
+        except Exception:
+            return None
     
     def get_server_public_key(self) -> str:
-        """获取服务器公钥 (通过 wg 命令)"""
+        """获取服务器公钥 (netlink 优先，否则通过 wg 命令；成功结果随 wg0.conf 缓存)"""
+        key = self._cached("server_public_key", self._read_server_public_key)
+        # 如果 wg 命令不可用，返回占位符 (不缓存，下次重试)
+        return key if key is not None else "<SERVER_PUBLIC_KEY>"
+    
+    def _read_server_public_key(self) -> Optional[str]:
+        if self.use_netlink:
+            messages = self._netlink_messages()
+            if messages is not None:
+                key = _netlink_key(messages[0].get_attr("WGDEVICE_A_PUBLIC_KEY"))
+                if key:
+                    return key
+        
         try:
             result = subprocess.run(
                 ["wg", "show", "wg0", "public-key"],
@@ -166,11 +313,8 @@ class WgParser:
                 check=True
             )
             return result.stdout.strip()
-        except subprocess.CalledProcessError:
-            # 如果 wg 命令不可用，返回占位符
-            return "<SERVER_PUBLIC_KEY>"
-        except FileNotFoundError:
-            return "<SERVER_PUBLIC_KEY>"
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return None
     
     def generate_peer_block(
         self,
@@ -182,24 +326,15 @@ class WgParser:
         preshared_key: Optional[str] = None,
     ) -> str:
         """生成 Peer 配置块 (含注释)"""
-        lines = [
-            "",
-            "# ==========================================",
-            f"# ClientName: {name}",
-            f"# AddedAt: {added_at}",
-            "# ==========================================",
-            "[Peer]",
-            f"PublicKey = {public_key}",
-            f"AllowedIPs = {assigned_ip}/32",
-        ]
-        
-        if preshared_key:
-            lines.append(f"PresharedKey = {preshared_key}")
-        
-        if endpoint:
-            lines.append(f"Endpoint = {endpoint}")
-        
-        return "\n".join(lines)
+        template = _PEER_BLOCK_TEMPLATES[(bool(preshared_key), bool(endpoint))]
+        return template.format_map({
+            "name": name,
+            "public_key": public_key,
+            "assigned_ip": assigned_ip,
+            "added_at": added_at,
+            "endpoint": endpoint,
+            "preshared_key": preshared_key,
+        })
     
     def add_peer(
         self,
@@ -210,96 +345,401 @@ class WgParser:
         endpoint: Optional[str] = None,
         preshared_key: Optional[str] = None,
     ) -> None:
-        """添加新 Peer 到配置文件"""
-        content = self.read_config()
-        
-        # 冲突检查
-        if self.check_name_conflict(name, content):
-            raise ValueError(f"设备名称已存在: {name}")
-        if self.check_ip_conflict(assigned_ip, content):
-            raise ValueError(f"IP 地址已被占用: {assigned_ip}")
-        
-        # 生成并追加配置块
-        peer_block = self.generate_peer_block(
-            name=name,
-            public_key=public_key,
-            assigned_ip=assigned_ip,
-            added_at=added_at,
-            endpoint=endpoint,
-            preshared_key=preshared_key,
-        )
+        """添加新 Peer 到配置文件 (加锁追加，不重写整个文件)"""
+        with open_locked_append(self.config_path) as f:
+            data = f.read()
+            
+            # 冲突检查 (单次扫描，持锁进行以免并发添加互相覆盖)
+            names, used = _scan_conflicts(data)
+            if name in names:
+                raise ValueError(f"设备名称已存在: {name}")
+            octet = _vpn_octet(assigned_ip)
+            if octet is not None and (used >> octet) & 1:
+                raise ValueError(f"IP 地址已被占用: {assigned_ip}")
+            
+            # 生成并追加配置块
+            peer_block = self.generate_peer_block(
+                name=name,
+                public_key=public_key,
+                assigned_ip=assigned_ip,
+                added_at=added_at,
+                endpoint=endpoint,
+                preshared_key=preshared_key,
+            )
+            
+            prefix = "" if not data or data.endswith(b"\n") else "\n"
+            f.write((prefix + peer_block + "\n").encode("utf-8"))
         
-        new_content = content.rstrip() + "\n" + peer_block + "\n"
-        self.write_config(new_content)
+        self.invalidate_peers_cache()
     
     def remove_peer(self, name: str) -> bool:
-        """从配置文件中移除指定 Peer"""
-        content = self.read_config()
-        
-        # 构建匹配特定 name 的模式
-        pattern = re.compile(
-            rf"\n?# =+\n# ClientName: {re.escape(name)}\n# AddedAt: .+?\n# =+\n\[Peer\]\n.*?(?=\n# =+|\Z)",
-            re.MULTILINE | re.DOTALL
-        )
-        
-        new_content, count = pattern.subn("", content)
-        
-        if count == 0:
-            return False
+        """从配置文件中移除指定 Peer (与 add_peer 使用同一把文件锁)"""
+        with open_locked(self.config_path) as f:
+            data = f.read()
+            
+            # 保留匹配块之间的片段，分段写出，避免拼接出完整的新内容
+            pattern = _compile_remove_pattern(re.escape(name.encode("utf-8")))
+            chunks = []
+            pos = 0
+            for match in pattern.finditer(data):
+                chunks.append(data[pos:match.start()])
+                pos = match.end()
+            
+            if not chunks:
+                return False
+            
+            chunks.append(data[pos:])
+            # 持锁期间完成替换，等待中的 add_peer 会重新打开新文件
+            write_atomic(self.config_path, chunks)
         
-        self.write_config(new_content)
+        self.invalidate_peers_cache()
         return True
     
-    def get_p2p_candidates(self, content: Optional[str] = None) -> list[WgPeer]:
-        """获取所有具有 Endpoint 的 Peer (可作为 P2P 直连目标)"""
-        peers = self.parse_peers(content)
-        return [p for p in peers if p.endpoint is not None]
+    def get_p2p_candidates(self, content: Optional[_Content] = None) -> list[WgPeer]:
+        """
+        获取所有具有 Endpoint 的 Peer (可作为 P2P 直连目标)
+        
+        结果随 wg0.conf 缓存；已有缓存索引时直接复用，否则只为带 Endpoint 的块构造对象。
+        """
+        if content is not None:
+            return self._endpoint_peers(_as_bytes(content))
+        return list(self._cached("p2p", self._read_endpoint_peers))
+    
+    def _read_endpoint_peers(self) -> list[WgPeer]:
+        return self._endpoint_peers(self._read_config_bytes())
+    
+    @staticmethod
+    def _endpoint_peers(data: bytes) -> list[WgPeer]:
+        index = _PEER_INDEX_CACHE.get(_content_digest(data))
+        if index is not None:
+            return list(index.endpoints)
+        return list(iter_peer_blocks_with_endpoint(data))
     
     def get_runtime_status(self) -> dict[str, dict]:
-        """通过 wg show 获取运行时状态"""
+        """获取运行时状态 (netlink 优先，否则通过 wg show)"""
+        if self.use_netlink:
+            messages = self._netlink_messages()
+            if messages is not None:
+                return _netlink_runtime_status(messages)
+        
         try:
             result = subprocess.run(
-                ["wg", "show", "wg0", "dump"],
+                _WG_DUMP_CMD,
                 capture_output=True,
-                text=True,
                 check=True
             )
         except (subprocess.CalledProcessError, FileNotFoundError):
             return {}
         
-        status = {}
-        lines = result.stdout.strip().split("\n")
-        
         # 第一行是 interface 信息，跳过
-        for line in lines[1:]:
-            parts = line.split("\t")
-            if len(parts) >= 8:
-                public_key = parts[0]
-                status[public_key] = {
-                    "preshared_key": parts[1] if parts[1] != "(none)" else None,
-                    "endpoint": parts[2] if parts[2] != "(none)" else None,
-                    "allowed_ips": parts[3],
-                    "latest_handshake": int(parts[4]) if parts[4] != "0" else None,
-                    "transfer_rx": int(parts[5]),
-                    "transfer_tx": int(parts[6]),
-                    "persistent_keepalive": parts[7] if parts[7] != "off" else None,
-                }
+        lines = result.stdout.splitlines()[1:]
+        return dict(filter(None, map(_parse_dump_line, lines)))
+    
+    async def get_runtime_status_async(self) -> dict[str, dict]:
+        """get_runtime_status 的异步版本: 流式读取 wg show 输出并逐行解析"""
+        if self.use_netlink:
+            # netlink 请求本身是阻塞调用，放到线程中执行
+            messages = await asyncio.to_thread(self._netlink_messages)
+            if messages is not None:
+                return _netlink_runtime_status(messages)
+        
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *_WG_DUMP_CMD,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            return {}
         
+        status = {}
+        finished = False
+        try:
+            await proc.stdout.readline()  # interface 行
+            async for line in proc.stdout:
+                item = _parse_dump_line(line)
+                if item is not None:
+                    status[item[0]] = item[1]
+            finished = True
+        finally:
+            # 解析出错时终止子进程；无论如何都回收，避免僵尸进程
+            if not finished and proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+            returncode = await proc.wait()
+        
+        if returncode != 0:
+            return {}
         return status
     
     def get_peers_with_status(self) -> list[WgPeer]:
-        """获取带有运行时状态的 Peer 列表"""
-        peers = self.parse_peers()
-        runtime = self.get_runtime_status()
+        """
+        获取带有运行时状态的 Peer 列表
+        
+        同一时间窗口内且 wg0.conf 未变化时直接返回缓存结果。
+        """
+        key = self._status_cache_key()
+        cached = self._peers_cache
+        if cached is None or cached[0] != key:
+            peers = _merge_status(self.get_peer_index(), self.get_runtime_status())
+            cached = self._peers_cache = (key, peers)
+        
+        return list(cached[1])
+    
+    async def get_peers_with_status_async(self) -> list[WgPeer]:
+        """get_peers_with_status 的异步版本 (与同步版本共享缓存)"""
+        key = self._status_cache_key()
+        cached = self._peers_cache
+        if cached is None or cached[0] != key:
+            index = await asyncio.to_thread(self.get_peer_index)
+            peers = _merge_status(index, await self.get_runtime_status_async())
+            cached = self._peers_cache = (key, peers)
+        
+        return list(cached[1])
+    
+    def _status_cache_key(self) -> tuple[int, int]:
+        """状态缓存键: (wg0.conf 的 mtime_ns, 时间窗口序号)"""
+        mtime_ns = os.stat(self.config_path).st_mtime_ns
+        return mtime_ns, int(time.monotonic() // _STATUS_CACHE_SECONDS)
+    
+    def invalidate_peers_cache(self) -> None:
+        """清除 get_peers_with_status 及按 mtime 缓存的派生结果"""
+        self._peers_cache = None
+        self._cache.clear()
+
+
+def _as_bytes(content: _Content) -> bytes:
+    """统一为 bytes (bytes 原样返回，不做复制)"""
+    return content if isinstance(content, bytes) else content.encode("utf-8")
+
+
+def _parse_dump_line(line: bytes) -> Optional[tuple[str, dict]]:
+    """解析 wg show dump 的一行 Peer 信息 (字段以 tab 分隔)"""
+    parts = line.rstrip(b"\n").split(b"\t")
+    if len(parts) < 8:
+        return None
+    
+    return parts[0].decode("ascii"), {
+        "preshared_key": parts[1].decode("ascii") if parts[1] != b"(none)" else None,
+        "endpoint": parts[2].decode("ascii") if parts[2] != b"(none)" else None,
+        "allowed_ips": parts[3].decode("ascii"),
+        "latest_handshake": int(parts[4]) if parts[4] != b"0" else None,
+        "transfer_rx": int(parts[5]),
+        "transfer_tx": int(parts[6]),
+        "persistent_keepalive": parts[7].decode("ascii") if parts[7] != b"off" else None,
+    }
+
+
+def _merge_status(index: PeerIndex, status: dict[str, dict]) -> list[WgPeer]:
+    """将运行时状态合并到 Peer 列表 (按公钥定位，不修改缓存的索引)"""
+    peers = list(index.peers)
+    for public_key, info in status.items():
+        i = index.by_pubkey.get(public_key)
+        if i is not None:
+            peers[i] = replace(
+                peers[i],
+                latest_handshake=info.get("latest_handshake"),
+                transfer_rx=info.get("transfer_rx"),
+                transfer_tx=info.get("transfer_tx"),
+            )
+    return peers
+
+
+# 解析出的原始字段: (name, added, pubkey, ips, psk, ep)，均未 strip
+_PeerRecord = tuple[bytes, bytes, Optional[bytes], Optional[bytes], Optional[bytes], Optional[bytes]]
+
+
+def iter_peer_records(data: bytes) -> Iterator[_PeerRecord]:
+    """
+    逐个解析带元数据注释头的 Peer 块，返回原始字段
+    
+    PEER_PATTERN 只含单行内的量词，匹配为线性时间；没有元数据注释块时直接跳过正则
+    (bytes.find 远快于逐位置尝试匹配)。
+    """
+    if data.find(_PEER_MARKER) == -1:
+        return
+    for match in PEER_PATTERN.finditer(data):
+        yield match.group("name", "added", "pubkey", "ips", "psk", "ep")
+
+
+def _peer_from_record(record: _PeerRecord) -> Optional[WgPeer]:
+    """由解析出的字段构造 WgPeer (缺少公钥或 AllowedIPs 时返回 None)"""
+    name, added, pubkey, allowed_ips, psk, endpoint = record
+    if not (pubkey and allowed_ips):
+        return None
+    
+    return WgPeer(
+        name=name.strip().decode("utf-8"),
+        public_key=pubkey.strip().decode("utf-8"),
+        allowed_ips=allowed_ips.strip().decode("utf-8"),
+        added_at=added.strip().decode("utf-8"),
+        endpoint=endpoint.strip().decode("utf-8") if endpoint else None,
+        preshared_key=psk.strip().decode("utf-8") if psk else None,
+    )
+
+
+def iter_peer_blocks_with_endpoint(data: bytes) -> Iterator[WgPeer]:
+    """只为带 Endpoint 的 Peer 块构造 WgPeer，其余块直接跳过"""
+    for record in iter_peer_records(data):
+        if record[5]:
+            peer = _peer_from_record(record)
+            if peer is not None:
+                yield peer
+
+
+def _parse_peer_index(data: bytes) -> PeerIndex:
+    """解析 Peer 并构建索引 (按内容的 blake2b 摘要缓存)"""
+    digest = _content_digest(data)
+    index = _PEER_INDEX_CACHE.get(digest)
+    if index is not None:
+        return index
+    
+    peers = [p for p in map(_peer_from_record, iter_peer_records(data)) if p is not None]
+    
+    index = PeerIndex(
+        peers=peers,
+        by_name={p.name: p for p in peers},
+        by_pubkey={p.public_key: i for i, p in enumerate(peers)},
+        endpoints=[p for p in peers if p.endpoint is not None],
+        used_ips=_scan_used_ips(data),
+    )
+    
+    if len(_PEER_INDEX_CACHE) >= _PEER_INDEX_CACHE_MAX:
+        # 多个线程可能同时淘汰同一个最旧条目，不加锁，容忍其已被移除
+        try:
+            _PEER_INDEX_CACHE.pop(next(iter(_PEER_INDEX_CACHE)), None)
+        except (StopIteration, RuntimeError):
+            pass
+    _PEER_INDEX_CACHE[digest] = index
+    return index
+
+
+def _scan_used_ips(data: bytes) -> int:
+    """直接从原文扫描网段内 AllowedIPs 的末位，构建已占用 IP 位图"""
+    used = _SERVER_BIT
+    for match in _ALLOWED_IP_SCAN.finditer(data):
+        octet = int(match.group("octet"))
+        if octet <= 255:
+            used |= 1 << octet
+    return used
+
+
+def _content_digest(data: bytes) -> bytes:
+    """Peer 索引缓存的键"""
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def _vpn_octet(ip: str) -> Optional[int]:
+    """解析 IP 的末位 (不在 VPN 网段内时返回 None)"""
+    addr = ip.split("/")[0]
+    parts = addr.split(".")
+    
+    # 与 IPv4Address 相同的校验: 4 段十进制、无前导零、每段 0~255
+    if len(parts) != 4 or not all(
+        part.isascii() and part.isdigit() and len(part) <= 3
+        and (part == "0" or part[0] != "0") and int(part) <= 255
+        for part in parts
+    ):
+        raise ValueError(f"无效的 IP 地址: {ip}")
+    
+    if not addr.startswith(_VPN_PREFIX):
+        return None
+    return int(parts[3])
+
+
+def _scan_conflicts(data: bytes) -> tuple[set[str], int]:
+    """
+    单次扫描配置内容
+    
+    返回: (设备名集合, 已占用 IP 位图)
+    """
+    names = set()
+    used = _SERVER_BIT
+    
+    for match in _CONFLICT_SCAN.finditer(data):
+        name, octet = match.group("name", "octet")
+        if name is not None:
+            names.add(name.strip().decode("utf-8"))
+        elif int(octet) <= 255:
+            used |= 1 << int(octet)
+    
+    return names, used
+
+
+@lru_cache(maxsize=128)
+def _compile_remove_pattern(name_escaped: bytes) -> re.Pattern:
+    """构建匹配特定 name 的 Peer 块模式 (按名称缓存编译结果)"""
+    return re.compile(
+        rb"\n?# =+\n# ClientName: " + name_escaped
+        + rb"\n# AddedAt: .+?\n# =+\n\[Peer\]\n.*?(?=\n(?:" + _BLOCK_END + rb")|\Z)",
+        re.MULTILINE | re.DOTALL
+    )
+
+
+def _netlink_key(value) -> Optional[str]:
+    """将 netlink 返回的密钥转为 Base64 字符串 (全零视为未设置)"""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) == 32:
+            value = base64.b64encode(value)
+        value = value.decode("ascii")
+    return None if value == _ZERO_KEY else value
+
+
+def _netlink_dump(interface: str) -> list:
+    """
+    通过共享的 netlink 句柄 dump 接口信息
+    
+    Peer 较多时内核会把结果拆成多条消息，这里全部返回。
+    """
+    global _nl_handle
+    with _nl_lock:
+        if _nl_handle is None:
+            from pyroute2 import WireGuard
+            _nl_handle = WireGuard()
+        return list(_nl_handle.info(interface))
+
+
+def _netlink_runtime_status(messages) -> dict[str, dict]:
+    """将 netlink 设备信息 (可能分为多条消息) 转换为与 wg show dump 相同的结构"""
+    status = {}
+    
+    peers = (
+        peer for message in messages
+        for peer in message.get_attr("WGDEVICE_A_PEERS") or []
+    )
+    for peer in peers:
+        public_key = _netlink_key(peer.get_attr("WGPEER_A_PUBLIC_KEY"))
+        if not public_key:
+            continue
         
-        for peer in peers:
-            if peer.public_key in runtime:
-                info = runtime[peer.public_key]
-                peer.latest_handshake = info.get("latest_handshake")
-                peer.transfer_rx = info.get("transfer_rx")
-                peer.transfer_tx = info.get("transfer_tx")
+        endpoint = None
+        ep = peer.get_attr("WGPEER_A_ENDPOINT")
+        if ep is not None and ep.get("port"):
+            addr = ep.get("addr")
+            endpoint = f"[{addr}]:{ep['port']}" if ":" in addr else f"{addr}:{ep['port']}"
+        
+        handshake = peer.get_attr("WGPEER_A_LAST_HANDSHAKE_TIME")
+        latest_handshake = handshake.get("tv_sec") if handshake is not None else None
+        keepalive = peer.get_attr("WGPEER_A_PERSISTENT_KEEPALIVE_INTERVAL")
+        allowed_ips = [
+            ip.get("addr") for ip in peer.get_attr("WGPEER_A_ALLOWEDIPS") or [] if ip.get("addr")
+        ]
         
-        return peers
+        status[public_key] = {
+            "preshared_key": _netlink_key(peer.get_attr("WGPEER_A_PRESHARED_KEY")),
+            "endpoint": endpoint,
+            "allowed_ips": ",".join(allowed_ips),
+            "latest_handshake": latest_handshake or None,
+            "transfer_rx": peer.get_attr("WGPEER_A_RX_BYTES") or 0,
+            "transfer_tx": peer.get_attr("WGPEER_A_TX_BYTES") or 0,
+            "persistent_keepalive": str(keepalive) if keepalive else None,
+        }
+    
+    return status
 
 
 def reload_wg(interface: str = "wg0") -> bool:
@@ -307,26 +747,18 @@ def reload_wg(interface: str = "wg0") -> bool:
     try:
         # 1. Strip: 生成仅含 Peer 的纯净配置
         strip_result = subprocess.run(
-            f"wg-quick strip {interface}",
-            shell=True,
+            ["wg-quick", "strip", interface],
             capture_output=True,
-            text=True,
             check=True
         )
         
-        strip_path = f"/tmp/{interface}.strip"
-        Path(strip_path).write_text(strip_result.stdout)
-        
-        # 2. Sync: 仅同步差异部分
+        # 2. Sync: 经 stdin 传入，仅同步差异部分 (无需临时文件)
         subprocess.run(
-            f"wg syncconf {interface} {strip_path}",
-            shell=True,
+            ["wg", "syncconf", interface, "/dev/stdin"],
+            input=strip_result.stdout,
             check=True
         )
         
-        # 3. Cleanup
-        os.remove(strip_path)
-        
         return True
     except subprocess.CalledProcessError as e:
         print(f"热重载失败: {e}")
@@ -336,22 +768,42 @@ def reload_wg(interface: str = "wg0") -> bool:
         return False
 
 
+def request_reload(interface: str = "wg0") -> None:
+    """
+    请求热重载 (立即返回)
+    
+    由后台线程执行 reload_wg，短时间内的多次请求合并为一次。
+    """
+    global _reload_thread
+    with _reload_thread_lock:
+        if _reload_thread is None or not _reload_thread.is_alive():
+            _reload_thread = threading.Thread(target=_reloader_loop, name="wg-reload", daemon=True)
+            _reload_thread.start()
+    _RELOAD_QUEUE.put_nowait(interface)
+
+
+def _reloader_loop() -> None:
+    """后台重载线程: 取出请求，等待写入平息后排空队列，每个接口只重载一次"""
+    while True:
+        pending = {_RELOAD_QUEUE.get()}
+        time.sleep(_RELOAD_DEBOUNCE_SECONDS)
+        while True:
+            try:
+                pending.add(_RELOAD_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        for interface in pending:
+            reload_wg(interface)
+
+
 def generate_client_config_template(
     server_public_key: str,
     server_endpoint: str,
     assigned_ip: str,
 ) -> str:
     """生成客户端配置模板 (供用户填空)"""
-    return f"""[Interface]
-# === 请填写您生成的私钥 ===
-PrivateKey = <YOUR_PRIVATE_KEY>
-Address = {assigned_ip}/24
-
-[Peer]
-PublicKey = {server_public_key}
-# === 如果您生成了预共享密钥，请填写 ===
-# PresharedKey = <YOUR_PRESHARED_KEY>
-Endpoint = {server_endpoint}
-AllowedIPs = 10.8.0.0/24
-PersistentKeepalive = 25
-"""
+    return _CLIENT_CONFIG_TEMPLATE.format_map({
+        "server_public_key": server_public_key,
+        "server_endpoint": server_endpoint,
+        "assigned_ip": assigned_ip,
+    })
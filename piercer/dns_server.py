@@ -4,15 +4,24 @@ Internal DNS Server
 仅解析 *.vpn.example.com 域名，将设备名映射到 VPN IP。
 """
 
+import os
 import socket
 import threading
 from typing import Optional
 
-from dnslib import DNSRecord, DNSHeader, RR, A, QTYPE
-
 from .core.wg_parser import WgParser
 from .config import settings
 
+# DNS 查询类型 A
+QTYPE_A = 1
+
+# 响应标志位: QR=1, AA=1, RA=1 (保留请求中的 Opcode/RD/CD)
+_REPLY_FLAGS = 0x8480
+_REQUEST_FLAGS_KEPT = 0x7910
+
+# A 记录应答前缀: 名称指针(指向问题区 qname) + TYPE A + CLASS IN + TTL 60 + RDLENGTH 4
+_A_RR_PREFIX = b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04"
+
 
 class InternalDNSServer:
     """内部 DNS 服务器"""
@@ -23,21 +32,46 @@ class InternalDNSServer:
         listen_port: int = 53,
         domain_suffix: str = ".vpn.example.com",
         wg_config_path: str = "/etc/wireguard/wg0.conf",
+        workers: Optional[int] = None,
     ):
         self.listen_address = listen_address
         self.listen_port = listen_port
         self.domain_suffix = domain_suffix.lower()
         self.wg_parser = WgParser(wg_config_path)
+        # 每个 worker 独占一个 SO_REUSEPORT socket，由内核分发数据包
+        self.workers = workers or os.cpu_count() or 1
         self.socket: Optional[socket.socket] = None
         self.running = False
-        self._thread: Optional[threading.Thread] = None
+        self._sockets: list[socket.socket] = []
+        self._threads: list[threading.Thread] = []
+        # name -> IP 映射缓存，仅在 wg0.conf 的 (mtime_ns, size) 变化时重建
+        self._mapping: dict[str, str] = {}
+        self._mapping_stamp: Optional[tuple[int, int]] = (-1, -1)
+        self._lock = threading.Lock()
     
     def get_name_to_ip_mapping(self) -> dict[str, str]:
+        """获取 name -> IP 映射 (配置文件未变化时直接返回缓存)"""
+        try:
+            st = os.stat(self.wg_parser.config_path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        
+        if stamp != self._mapping_stamp:
+            with self._lock:
+                if stamp != self._mapping_stamp:
+                    # 整体替换引用，读取方无需加锁
+                    self._mapping = self.build_name_to_ip_mapping()
+                    self._mapping_stamp = stamp
+        
+        return self._mapping
+    
+    def build_name_to_ip_mapping(self) -> dict[str, str]:
         """从 WireGuard 配置构建 name -> IP 映射"""
         mapping = {}
         
         try:
-            peers = self.wg_parser.parse_peers()
+            peers = self.wg_parser.get_peer_index().peers
             for peer in peers:
                 # 将设备名转换为小写用于 DNS 查询
                 name = peer.name.lower()
@@ -62,7 +96,7 @@ class InternalDNSServer:
         qname = qname.lower().rstrip(".")
         
         # 只处理 A 记录查询
-        if qtype != QTYPE.A:
+        if qtype != QTYPE_A:
             return None
         
         # 检查域名后缀
@@ -78,8 +112,16 @@ class InternalDNSServer:
     
     def handle_request(self, data: bytes, addr: tuple) -> bytes:
         """处理单个 DNS 请求"""
+        # 快速路径: 手工解析问题区，直接在原始报文上拼装响应
+        question = _extract_question(data)
+        if question is not None:
+            qname, qtype, end = question
+            return _pack_reply(data, end, self.resolve_query(qname, qtype))
+        
+        # 非常规报文 (多个问题、压缩指针等) 交由 dnslib 处理
+        dnslib = _lazy_dnslib()
         try:
-            request = DNSRecord.parse(data)
+            request = dnslib.DNSRecord.parse(data)
         except Exception:
             return b""
         
@@ -94,12 +136,12 @@ class InternalDNSServer:
         if ip:
             # 找到记录
             reply = request.reply()
-            reply.add_answer(RR(
+            reply.add_answer(dnslib.RR(
                 rname=request.q.qname,
-                rtype=QTYPE.A,
+                rtype=QTYPE_A,
                 rclass=1,
                 ttl=60,
-                rdata=A(ip),
+                rdata=dnslib.A(ip),
             ))
         else:
             # NXDOMAIN
@@ -108,39 +150,133 @@ class InternalDNSServer:
         
         return reply.pack()
     
-    def serve_forever(self):
-        """启动 DNS 服务 (阻塞)"""
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket.bind((self.listen_address, self.listen_port))
-        self.socket.settimeout(1.0)
+    def _open_sockets(self) -> None:
+        """绑定 worker sockets (不支持 SO_REUSEPORT 的平台仅使用一个)"""
+        reuse_port = hasattr(socket, "SO_REUSEPORT")
+        count = self.workers if reuse_port else 1
         
-        self.running = True
-        print(f"DNS Server listening on {self.listen_address}:{self.listen_port}")
+        self._sockets = []
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((self.listen_address, self.listen_port))
+            self._sockets.append(sock)
         
+        self.socket = self._sockets[0]
+        self.running = True
+        print(f"DNS Server listening on {self.listen_address}:{self.listen_port} ({count} workers)")
+    
+    def _serve_socket(self, sock: socket.socket) -> None:
+        """单个 worker 的收发循环"""
         while self.running:
             try:
-                data, addr = self.socket.recvfrom(512)
+                data, addr = sock.recvfrom(512)
+            except OSError as e:
+                # stop() 关闭 socket 时退出；运行中的瞬时错误 (如 ICMP 回报) 不应终止 worker
+                if not self.running:
+                    break
+                print(f"DNS Error: {e}")
+                continue
+            
+            # stop() 唤醒阻塞中的 recvfrom 后会收到空数据
+            if not self.running:
+                break
+            
+            try:
                 response = self.handle_request(data, addr)
                 if response:
-                    self.socket.sendto(response, addr)
-            except socket.timeout:
-                continue
+                    sock.sendto(response, addr)
             except Exception as e:
                 print(f"DNS Error: {e}")
         
-        self.socket.close()
+        sock.close()
+    
+    def _start_workers(self, sockets: list[socket.socket]) -> None:
+        """为每个 socket 启动一个后台线程"""
+        for sock in sockets:
+            thread = threading.Thread(target=self._serve_socket, args=(sock,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def serve_forever(self):
+        """启动 DNS 服务 (阻塞)"""
+        self._open_sockets()
+        self._start_workers(self._sockets[1:])
+        self._serve_socket(self._sockets[0])
     
     def start_background(self):
         """在后台线程启动 DNS 服务"""
-        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
-        self._thread.start()
+        self._open_sockets()
+        self._start_workers(self._sockets)
     
     def stop(self):
         """停止 DNS 服务"""
         self.running = False
-        if self._thread:
-            self._thread.join(timeout=2)
+        for sock in self._sockets:
+            try:
+                # 唤醒阻塞在 recvfrom 上的 worker
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+
+def _extract_question(data: bytes) -> Optional[tuple[str, int, int]]:
+    """
+    解析单问题请求的问题区
+    
+    返回: (qname, qtype, 问题区结束偏移)；报文不符合常规格式时返回 None
+    """
+    if len(data) < 12 or data[4:6] != b"\x00\x01":
+        return None
+    
+    labels = []
+    i = 12
+    while True:
+        if i >= len(data):
+            return None
+        length = data[i]
+        if length == 0:
+            break
+        # 问题区不应出现压缩指针 (0xC0) 或扩展 label 类型
+        if length & 0xC0:
+            return None
+        labels.append(data[i + 1:i + 1 + length])
+        i += length + 1
+    
+    end = i + 5
+    if end > len(data):
+        return None
+    
+    qname = b".".join(labels).decode("latin-1") + "."
+    qtype = int.from_bytes(data[i + 1:i + 3], "big")
+    return qname, qtype, end
+
+
+def _pack_reply(data: bytes, end: int, ip: Optional[str]) -> bytes:
+    """
+    基于请求报文直接构造响应 (跳过 dnslib 对象构建)
+    
+    问题区原样返回并丢弃请求中的附加记录 (如 EDNS OPT)；ip 为 None 时返回 NXDOMAIN。
+    """
+    flags = (int.from_bytes(data[2:4], "big") & _REQUEST_FLAGS_KEPT) | _REPLY_FLAGS
+    if ip is None:
+        flags |= 3  # NXDOMAIN
+    
+    header = data[:2] + flags.to_bytes(2, "big") + b"\x00\x01"
+    if ip is None:
+        return header + b"\x00\x00\x00\x00\x00\x00" + data[12:end]
+    return header + b"\x00\x01\x00\x00\x00\x00" + data[12:end] + _A_RR_PREFIX + socket.inet_aton(ip)
+
+
+def _lazy_dnslib():
+    """延迟导入 dnslib (仅在需要完整解析/构建报文时加载)"""
+    import dnslib
+    return dnslib
 
 
 def create_dns_server() -> InternalDNSServer:
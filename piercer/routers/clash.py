@@ -57,7 +57,7 @@ async def upload_config(request: Request):
     if not content.strip():
         return UploadResponse(success=False, message="配置内容为空")
     
-    parser = ClashParser(settings.clash_config_path)
+    parser = ClashParser(settings.clash_config_path, fast_providers=settings.clash_fast_parse)
     
     try:
         parser.write_config(content)
@@ -74,7 +74,7 @@ async def download_config():
     
     读取并返回 uploaded_clash.yaml 内容
     """
-    parser = ClashParser(settings.clash_config_path)
+    parser = ClashParser(settings.clash_config_path, fast_providers=settings.clash_fast_parse)
     
     try:
         content = parser.read_config()
@@ -93,7 +93,7 @@ async def get_subscription_status():
     2. 正则匹配 Key: ^(.+)-(\\d{4})-(\\d{2})-(\\d{2})$
     3. 返回过期天数与状态告警
     """
-    parser = ClashParser(settings.clash_config_path)
+    parser = ClashParser(settings.clash_config_path, fast_providers=settings.clash_fast_parse)
     
     if not parser.exists():
         return StatusResponse(
@@ -4,15 +4,20 @@ WireGuard API Router
 提供 WireGuard 配置管理的 RPC 接口。
 """
 
+import os
 from datetime import date
+from functools import lru_cache, partial
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException
+import anyio
+import orjson
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel, Field
 
 from ..core.wg_parser import (
     WgParser,
-    reload_wg,
+    WgPeer,
+    request_reload,
     generate_client_config_template,
 )
 from ..config import settings
@@ -78,6 +83,52 @@ class OperationResponse(BaseModel):
     message: str
 
 
+# 密钥生成指引 (仅分配的 IP 随请求变化)
+_INSTRUCTIONS_TMPL = """**[密钥生成指南]**
+Server 已为您分配 IP: `{assigned_ip}`。请在您的本地设备生成密钥：
+1. **生成密钥对**: `wg genkey | tee private.key | wg pubkey > public.key`
+2. **生成预共享密钥**: `wg genpsk > preshared.key`
+
+**请仅提交 `public.key` 和 `preshared.key` 给 Agent。不要泄露 `private.key`。**"""
+
+
+# === Parser Cache ===
+
+@lru_cache(maxsize=8)
+def _get_parser(path: str, use_netlink: bool, mtime_ns: int) -> WgParser:
+    """按 (路径, mtime) 缓存 WgParser 实例，文件变化后自动换新"""
+    return WgParser(path, use_netlink=use_netlink)
+
+
+def _parser() -> WgParser:
+    """获取当前配置对应的 WgParser"""
+    path = settings.wg_config_path
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime_ns = -1
+    return _get_parser(path, settings.wg_use_netlink, mtime_ns)
+
+
+def _peer_dict(p: WgPeer) -> dict:
+    """WgPeer -> PeerInfo 同构的 dict (不含预共享密钥)"""
+    return {
+        "name": p.name,
+        "public_key": p.public_key,
+        "allowed_ips": p.allowed_ips,
+        "added_at": p.added_at,
+        "endpoint": p.endpoint,
+        "latest_handshake": p.latest_handshake,
+        "transfer_rx": p.transfer_rx,
+        "transfer_tx": p.transfer_tx,
+    }
+
+
+def _json_response(payload: dict) -> Response:
+    """用 orjson 一次性序列化 (跳过 response_model 校验与 jsonable_encoder)"""
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+
 # === API Endpoints ===
 
 @router.get("/config/template", response_model=ConfigTemplateResponse)
@@ -89,10 +140,11 @@ async def get_config_template():
     2. 提取 Server 公钥
     3. 返回包含指引注释的 Config 文本
     """
-    parser = WgParser(settings.wg_config_path)
+    parser = _parser()
     
+    # 解析与 wg pubkey 子进程均为阻塞调用，放到线程池执行
     try:
-        next_ip = parser.get_next_available_ip()
+        next_ip = await anyio.to_thread.run_sync(parser.get_next_available_ip)
         assigned_ip = str(next_ip)
     except FileNotFoundError:
         # 如果配置文件不存在，从 .2 开始
@@ -100,7 +152,7 @@ async def get_config_template():
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     
-    server_public_key = parser.get_server_public_key()
+    server_public_key = await anyio.to_thread.run_sync(parser.get_server_public_key)
     
     # 检查 server_endpoint 是否已配置
     if not settings.is_server_endpoint_configured():
@@ -114,12 +166,7 @@ async def get_config_template():
         assigned_ip=assigned_ip,
     )
     
-    instructions = f"""**[密钥生成指南]**
-Server 已为您分配 IP: `{assigned_ip}`。请在您的本地设备生成密钥：
-1. **生成密钥对**: `wg genkey | tee private.key | wg pubkey > public.key`
-2. **生成预共享密钥**: `wg genpsk > preshared.key`
-
-**请仅提交 `public.key` 和 `preshared.key` 给 Agent。不要泄露 `private.key`。**"""
+    instructions = _INSTRUCTIONS_TMPL.format_map({"assigned_ip": assigned_ip})
     
     return ConfigTemplateResponse(
         success=True,
@@ -131,7 +178,7 @@ Server 已为您分配 IP: `{assigned_ip}`。请在您的本地设备生成密
     )
 
 
-@router.get("/peer/list", response_model=PeerListResponse)
+@router.get("/peer/list", responses={200: {"model": PeerListResponse}})
 async def list_peers():
     """
     查询所有 Peer 状态
@@ -140,35 +187,22 @@ async def list_peers():
     2. 运行 wg show wg0 dump 获取握手/流量
     3. 合并返回
     """
-    parser = WgParser(settings.wg_config_path)
+    parser = _parser()
     
     try:
-        peers = parser.get_peers_with_status()
+        peers = await parser.get_peers_with_status_async()
     except FileNotFoundError:
-        return PeerListResponse(success=True, count=0, peers=[])
+        peers = []
     
-    peer_infos = [
-        PeerInfo(
-            name=p.name,
-            public_key=p.public_key,
-            allowed_ips=p.allowed_ips,
-            added_at=p.added_at,
-            endpoint=p.endpoint,
-            latest_handshake=p.latest_handshake,
-            transfer_rx=p.transfer_rx,
-            transfer_tx=p.transfer_tx,
-        )
-        for p in peers
-    ]
-    
-    return PeerListResponse(
-        success=True,
-        count=len(peer_infos),
-        peers=peer_infos,
-    )
+    # 数据来自自身解析器，直接序列化，跳过 Pydantic 校验
+    return _json_response({
+        "success": True,
+        "count": len(peers),
+        "peers": [_peer_dict(p) for p in peers],
+    })
 
 
-@router.get("/peer/p2p_candidates", response_model=P2PCandidatesResponse)
+@router.get("/peer/p2p_candidates", responses={200: {"model": P2PCandidatesResponse}})
 async def get_p2p_candidates():
     """
     获取直连节点
@@ -177,32 +211,21 @@ async def get_p2p_candidates():
     2. 筛选出所有拥有 Endpoint 字段的 Peer
     3. 返回列表，供客户端配置 Site-to-Site
     """
-    parser = WgParser(settings.wg_config_path)
+    parser = _parser()
     
     try:
-        candidates = parser.get_p2p_candidates()
+        candidates = await anyio.to_thread.run_sync(parser.get_p2p_candidates)
     except FileNotFoundError:
-        return P2PCandidatesResponse(success=True, count=0, candidates=[])
-    
-    candidate_infos = [
-        PeerInfo(
-            name=p.name,
-            public_key=p.public_key,
-            allowed_ips=p.allowed_ips,
-            added_at=p.added_at,
-            endpoint=p.endpoint,
-        )
-        for p in candidates
-    ]
+        candidates = []
     
-    return P2PCandidatesResponse(
-        success=True,
-        count=len(candidate_infos),
-        candidates=candidate_infos,
-    )
+    return _json_response({
+        "success": True,
+        "count": len(candidates),
+        "candidates": [_peer_dict(p) for p in candidates],
+    })
 
 
-@router.post("/peer/add", response_model=OperationResponse)
+@router.post("/peer/add", responses={200: {"model": OperationResponse}})
 async def add_peer(req: PeerAddRequest):
     """
     注册设备
@@ -210,36 +233,40 @@ async def add_peer(req: PeerAddRequest):
     1. 校验 IP 冲突
     2. 组装 INI 块 (含注释)
     3. 若有 endpoint 则写入该行
-    4. 追加写入文件 -> wg syncconf
+    4. 追加写入文件 -> wg syncconf (合并短时间内的多次写入)
     """
-    parser = WgParser(settings.wg_config_path)
+    parser = _parser()
     today = date.today().isoformat()
     
     try:
-        parser.add_peer(
+        # 文件锁等待与 fsync 均为阻塞调用，放到线程中执行
+        await anyio.to_thread.run_sync(partial(
+            parser.add_peer,
             name=req.name,
             public_key=req.public_key,
             assigned_ip=req.assigned_ip,
             added_at=today,
             endpoint=req.endpoint,
             preshared_key=req.preshared_key,
-        )
+        ))
     except FileNotFoundError:
         raise HTTPException(status_code=503, detail="WireGuard 配置文件不存在")
     except ValueError as e:
-        return OperationResponse(success=False, message=str(e))
+        return _json_response({"success": False, "message": str(e)})
+    
+    _get_parser.cache_clear()
     
     # 热重载配置
     if settings.enable_wg_reload:
-        reload_wg()
+        request_reload()
     
-    return OperationResponse(
-        success=True,
-        message=f"设备 '{req.name}' 已成功添加，IP: {req.assigned_ip}",
-    )
+    return _json_response({
+        "success": True,
+        "message": f"设备 '{req.name}' 已成功添加，IP: {req.assigned_ip}",
+    })
 
 
-@router.post("/peer/del", response_model=OperationResponse)
+@router.post("/peer/del", responses={200: {"model": OperationResponse}})
 async def delete_peer(req: PeerDelRequest):
     """
     移除设备
@@ -247,24 +274,26 @@ async def delete_peer(req: PeerDelRequest):
     1. 正则定位注释块+Peer块
     2. 内存删除 -> 覆写文件 -> wg syncconf
     """
-    parser = WgParser(settings.wg_config_path)
+    parser = _parser()
     
     try:
-        removed = parser.remove_peer(req.name)
+        removed = await anyio.to_thread.run_sync(parser.remove_peer, req.name)
     except FileNotFoundError:
         raise HTTPException(status_code=503, detail="WireGuard 配置文件不存在")
     
     if not removed:
-        return OperationResponse(
-            success=False,
-            message=f"未找到设备: {req.name}",
-        )
+        return _json_response({
+            "success": False,
+            "message": f"未找到设备: {req.name}",
+        })
+    
+    _get_parser.cache_clear()
     
     # 热重载配置
     if settings.enable_wg_reload:
-        reload_wg()
+        request_reload()
     
-    return OperationResponse(
-        success=True,
-        message=f"设备 '{req.name}' 已成功移除",
-    )
+    return _json_response({
+        "success": True,
+        "message": f"设备 '{req.name}' 已成功移除",
+    })
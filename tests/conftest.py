@@ -0,0 +1,27 @@
+"""
+Shared test fixtures
+"""
+
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def golden_file(tmp_path_factory):
+    """
+    返回写入样例文件的函数: golden_file(文件名, 内容) -> Path
+
+    相同的 (文件名, 内容) 在整个会话中只写入一次，测试再按需复制到各自的临时目录。
+    """
+    written: dict[tuple[str, str], Path] = {}
+
+    def write(filename: str, content: str) -> Path:
+        key = (filename, content)
+        if key not in written:
+            path = tmp_path_factory.mktemp("golden") / filename
+            path.write_text(content)
+            written[key] = path
+        return written[key]
+
+    return write
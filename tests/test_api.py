@@ -5,8 +5,9 @@ Tests for API Endpoints
 import pytest
 from fastapi.testclient import TestClient
 from pathlib import Path
-import tempfile
+import shutil
 import os
+from dataclasses import replace
 from unittest.mock import patch
 
 
@@ -25,33 +26,35 @@ AllowedIPs = 10.8.0.5/32
 """
 
 
-@pytest.fixture
-def temp_wg_config():
-    """创建临时 WG 配置文件"""
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-        f.write(SAMPLE_WG_CONFIG)
-        f.flush()
-        yield f.name
-    Path(f.name).unlink(missing_ok=True)
+@pytest.fixture(scope="class")
+def temp_wg_config(tmp_path_factory):
+    """同一测试类共享的 WG 配置文件路径 (内容由 client 在每个测试前重置)"""
+    return str(tmp_path_factory.mktemp("wg") / "wg0.conf")
 
 
-@pytest.fixture
-def temp_clash_dir():
-    """创建临时 Clash 配置目录"""
-    with tempfile.TemporaryDirectory() as d:
-        yield d
+@pytest.fixture(scope="class")
+def temp_clash_dir(tmp_path_factory):
+    """同一测试类共享的 Clash 配置目录"""
+    return str(tmp_path_factory.mktemp("clash"))
 
 
-@pytest.fixture
-def client(temp_wg_config, temp_clash_dir):
-    """创建测试客户端"""
-    # 创建新的 Settings 实例并 patch
+@pytest.fixture(scope="session")
+def base_settings():
+    """整个会话只读取一次环境变量"""
     from piercer.config import Settings
-    
-    test_settings = Settings()
-    test_settings.wg_config_path = temp_wg_config
-    test_settings.clash_config_path = f"{temp_clash_dir}/clash.yaml"
-    test_settings.enable_wg_reload = False
+    return Settings()
+
+
+@pytest.fixture(scope="class")
+def shared_client(base_settings, temp_wg_config, temp_clash_dir):
+    """同一测试类共享的测试客户端"""
+    # 基于共享的 Settings 替换字段并 patch
+    test_settings = replace(
+        base_settings,
+        wg_config_path=temp_wg_config,
+        clash_config_path=f"{temp_clash_dir}/clash.yaml",
+        enable_wg_reload=False,
+    )
     
     with patch("piercer.routers.wg.settings", test_settings), \
          patch("piercer.routers.clash.settings", test_settings):
@@ -59,6 +62,18 @@ def client(temp_wg_config, temp_clash_dir):
         yield TestClient(app)
 
 
+@pytest.fixture
+def client(shared_client, golden_file, temp_wg_config, temp_clash_dir):
+    """创建测试客户端 (每个测试前恢复样例配置并清空 Clash 目录)"""
+    from piercer.routers.wg import _get_parser
+    
+    shutil.copyfile(golden_file("wg0.conf", SAMPLE_WG_CONFIG), temp_wg_config)
+    for path in Path(temp_clash_dir).iterdir():
+        path.unlink()
+    _get_parser.cache_clear()
+    return shared_client
+
+
 class TestHealthEndpoints:
     """测试健康检查端点"""
     
@@ -97,6 +112,22 @@ class TestWgEndpoints:
         assert data["count"] == 1
         assert data["peers"][0]["name"] == "test-device"
     
+    def test_list_peers_fields(self, client):
+        client.post("/api/wg/peer/add", json={
+            "name": "psk-device",
+            "public_key": "PSK_PUBLIC_KEY",
+            "assigned_ip": "10.8.0.11",
+            "preshared_key": "SECRET_PSK",
+        })
+        
+        response = client.get("/api/wg/peer/list")
+        assert response.headers["content-type"] == "application/json"
+        assert "SECRET_PSK" not in response.text
+        assert set(response.json()["peers"][0]) == {
+            "name", "public_key", "allowed_ips", "added_at", "endpoint",
+            "latest_handshake", "transfer_rx", "transfer_tx",
+        }
+    
     def test_get_p2p_candidates(self, client):
         response = client.get("/api/wg/peer/p2p_candidates")
         assert response.status_code == 200
@@ -117,6 +148,18 @@ class TestWgEndpoints:
         assert data["success"] is True
         assert "new-device" in data["message"]
     
+    def test_add_peer_then_list(self, client):
+        client.get("/api/wg/peer/list")
+        client.post("/api/wg/peer/add", json={
+            "name": "new-device",
+            "public_key": "NEW_PUBLIC_KEY",
+            "assigned_ip": "10.8.0.10",
+        })
+        
+        data = client.get("/api/wg/peer/list").json()
+        assert data["count"] == 2
+        assert data["peers"][1]["name"] == "new-device"
+    
     def test_add_peer_conflict(self, client):
         response = client.post("/api/wg/peer/add", json={
             "name": "test-device",
@@ -138,6 +181,30 @@ class TestWgEndpoints:
         data = response.json()
         assert data["success"] is True
     
+    def test_writes_run_off_event_loop(self, client, monkeypatch):
+        import asyncio
+        from piercer.core.wg_parser import WgParser
+        
+        loops = []
+        
+        def record(*args, **kwargs):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return True
+        
+        monkeypatch.setattr(WgParser, "add_peer", record)
+        monkeypatch.setattr(WgParser, "remove_peer", record)
+        client.post("/api/wg/peer/add", json={
+            "name": "new-device",
+            "public_key": "NEW_PUBLIC_KEY",
+            "assigned_ip": "10.8.0.10",
+        })
+        client.post("/api/wg/peer/del", json={"name": "test-device"})
+        
+        assert loops == [None, None]
+    
     def test_delete_peer_not_found(self, client):
         response = client.post("/api/wg/peer/del", json={
             "name": "nonexistent",
@@ -168,13 +235,9 @@ proxy-providers:
         data = response.json()
         assert data["success"] is True
     
-    def test_download_config_not_found(self, client, temp_clash_dir):
+    def test_download_config_not_found(self, client, base_settings, temp_clash_dir):
         # 确保使用一个不存在的路径
-        from piercer.config import Settings
-        from unittest.mock import patch
-        
-        test_settings = Settings()
-        test_settings.clash_config_path = f"{temp_clash_dir}/nonexistent.yaml"
+        test_settings = replace(base_settings, clash_config_path=f"{temp_clash_dir}/nonexistent.yaml")
         
         with patch("piercer.routers.clash.settings", test_settings):
             from piercer.main import app
@@ -4,10 +4,9 @@ Tests for Clash Parser
 
 import pytest
 from datetime import date
-from pathlib import Path
-import tempfile
+import shutil
 
-from piercer.core.clash_parser import ClashParser, SubscriptionInfo
+from piercer.core.clash_parser import ClashParser, SubscriptionInfo, DATE_PATTERN
 
 
 # 测试用的配置文件内容
@@ -50,13 +49,11 @@ rules:
 
 
 @pytest.fixture
-def temp_config_file():
-    """创建临时配置文件"""
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".yaml", delete=False) as f:
-        f.write(SAMPLE_CLASH_CONFIG)
-        f.flush()
-        yield f.name
-    Path(f.name).unlink(missing_ok=True)
+def temp_config_file(golden_file, tmp_path):
+    """创建临时配置文件 (复制自样例)"""
+    dst = tmp_path / "clash.yaml"
+    shutil.copyfile(golden_file("clash.yaml", SAMPLE_CLASH_CONFIG), dst)
+    return str(dst)
 
 
 @pytest.fixture
@@ -80,11 +77,43 @@ class TestClashParser:
         assert "proxy-providers" in config
         assert len(config["proxy-providers"]) == 3
     
+    def test_parse_yaml_cached(self, parser):
+        assert parser.parse_yaml() is parser.parse_yaml()
+    
+    def test_parse_yaml_invalidated_on_write(self, parser):
+        parser.parse_yaml()
+        parser.write_config("proxy-providers: {}\n")
+        assert parser.parse_yaml()["proxy-providers"] == {}
+    
     def test_get_proxy_providers(self, parser):
         providers = parser.get_proxy_providers()
         assert len(providers) == 3
         assert "provider-a-2026-02-15" in providers
     
+    def test_fast_providers_matches_yaml(self, parser):
+        providers = parser._fast_providers(SAMPLE_CLASH_CONFIG)
+        full = parser.parse_yaml()["proxy-providers"]
+        
+        assert list(providers) == list(full)
+        for key, value in providers.items():
+            assert value["url"] == full[key]["url"]
+    
+    def test_fast_providers_fallback(self, parser):
+        # 流式映射、锚点/合并键、多行标量均交由完整解析器处理
+        assert parser._fast_providers("proxy-providers:\n  a: {url: x}\n") is None
+        assert parser._fast_providers(
+            "proxy-providers:\n  a: &p\n    url: x\n  b:\n    <<: *p\n"
+        ) is None
+        assert parser._fast_providers(
+            "proxy-providers:\n  a:\n    url: |\n      https://x\n"
+        ) is None
+        assert parser._fast_providers("port: 7890\n") is None
+    
+    def test_get_proxy_providers_without_fast_path(self, temp_config_file):
+        parser = ClashParser(temp_config_file, fast_providers=False)
+        providers = parser.get_proxy_providers()
+        assert providers["legacy-provider"]["interval"] == 3600
+    
     def test_parse_subscription_date_valid(self, parser):
         name, expire_date = parser.parse_subscription_date("provider-a-2026-02-15")
         assert name == "provider-a"
@@ -95,6 +124,28 @@ class TestClashParser:
         assert name == "legacy-provider"
         assert expire_date is None
     
+    def test_parse_subscription_date_matches_pattern(self, parser):
+        keys = [
+            "provider-a-2026-02-15",
+            "a-2026-02-15",
+            "-2026-02-15",
+            "2026-02-15",
+            "provider-2026-02-30",
+            "provider-2026-2-15",
+            "provider-20a6-02-15",
+            "provider_2026-02-15",
+            "provider-2026-02-15-x",
+        ]
+        for key in keys:
+            match = DATE_PATTERN.match(key)
+            expected = (key, None)
+            if match:
+                try:
+                    expected = (match.group(1), date(*map(int, match.group(2, 3, 4))))
+                except ValueError:
+                    pass
+            assert parser.parse_subscription_date(key) == expected, key
+    
     def test_calculate_status_active(self, parser):
         test_date = date(2026, 1, 28)
         expire_date = date(2026, 2, 15)
@@ -132,6 +183,18 @@ class TestClashParser:
         
         # 检查排序 (expired/expiring first, then by days)
         # provider-b 过期了, legacy 是 unknown, provider-a 是 active
+        assert [s.status for s in subscriptions] == ["expired", "active", "unknown"]
+        assert subscriptions[0].name == "provider-b"
+    
+    def test_get_subscription_status_sorts_by_days(self, parser):
+        # provider-a 当天到期 (0 天) 应排在 7 天后到期的订阅之前
+        parser.write_config(
+            "proxy-providers:\n"
+            "  late-2026-02-22:\n    url: a\n"
+            "  today-2026-02-15:\n    url: b\n"
+        )
+        subscriptions = parser.get_subscription_status(date(2026, 2, 15))
+        assert [s.name for s in subscriptions] == ["today", "late"]
     
     def test_get_status_summary(self, parser):
         test_date = date(2026, 1, 28)
@@ -140,6 +203,12 @@ class TestClashParser:
         assert summary["total"] == 3
         assert "subscriptions" in summary
         assert len(summary["subscriptions"]) == 3
+    
+    def test_get_status_summary_cached(self, parser):
+        test_date = date(2026, 1, 28)
+        summary = parser.get_status_summary(test_date)
+        assert parser.get_status_summary(test_date) is summary
+        assert parser.get_status_summary(date(2026, 1, 29)) is not summary
 
 
 class TestClashParserNoFile:
@@ -0,0 +1,223 @@
+"""
+Tests for Internal DNS Server
+"""
+
+import os
+import pytest
+import shutil
+import socket
+
+from dnslib import DNSRecord, RR, A, QTYPE
+
+from piercer.dns_server import InternalDNSServer
+
+
+SAMPLE_WG_CONFIG = """[Interface]
+PrivateKey = SERVER_PRIVATE_KEY
+Address = 10.8.0.1/24
+ListenPort = 51820
+
+# ==========================================
+# ClientName: MacBook-Pro
+# AddedAt: 2026-01-27
+# ==========================================
+[Peer]
+PublicKey = CLIENT1_PUBLIC_KEY
+AllowedIPs = 10.8.0.5/32
+"""
+
+
+@pytest.fixture
+def temp_config_file(golden_file, tmp_path):
+    """创建临时配置文件 (复制自样例)"""
+    dst = tmp_path / "wg0.conf"
+    shutil.copyfile(golden_file("wg0.conf", SAMPLE_WG_CONFIG), dst)
+    return str(dst)
+
+
+@pytest.fixture
+def server(temp_config_file):
+    """创建 DNS 服务器实例 (不绑定端口)"""
+    return InternalDNSServer(wg_config_path=temp_config_file)
+
+
+class TestNameMapping:
+    """测试 name -> IP 映射"""
+
+    def test_mapping(self, server):
+        mapping = server.get_name_to_ip_mapping()
+        assert mapping["macbook-pro"] == "10.8.0.5"
+        assert mapping["server"] == "10.8.0.1"
+
+    def test_mapping_cached(self, server):
+        assert server.get_name_to_ip_mapping() is server.get_name_to_ip_mapping()
+
+    def test_mapping_rebuilt_on_same_mtime(self, server, temp_config_file):
+        assert "ipad" not in server.get_name_to_ip_mapping()
+        st = os.stat(temp_config_file)
+        with open(temp_config_file, "a") as f:
+            f.write(
+                "\n# ==========================================\n"
+                "# ClientName: iPad\n"
+                "# AddedAt: 2026-01-28\n"
+                "# ==========================================\n"
+                "[Peer]\nPublicKey = CLIENT2_PUBLIC_KEY\nAllowedIPs = 10.8.0.6/32\n"
+            )
+        # 保持 mtime 不变，仅靠文件大小识别变化
+        os.utime(temp_config_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        assert server.get_name_to_ip_mapping()["ipad"] == "10.8.0.6"
+
+    def test_mapping_missing_file(self):
+        server = InternalDNSServer(wg_config_path="/nonexistent/wg0.conf")
+        assert server.get_name_to_ip_mapping() == {
+            "server": "10.8.0.1",
+            "gateway": "10.8.0.1",
+        }
+
+    def test_resolve_query(self, server):
+        assert server.resolve_query("macbook-pro.vpn.example.com.", 1) == "10.8.0.5"
+        assert server.resolve_query("unknown.vpn.example.com.", 1) is None
+        assert server.resolve_query("macbook-pro.example.org.", 1) is None
+
+
+class TestHandleRequest:
+    """测试 DNS 报文处理"""
+
+    def test_a_record(self, server):
+        query = DNSRecord.question("MacBook-Pro.vpn.example.com")
+        reply = DNSRecord.parse(server.handle_request(query.pack(), ("127.0.0.1", 5353)))
+
+        assert reply.header.id == query.header.id
+        assert reply.header.qr == 1
+        assert reply.header.aa == 1
+        assert reply.header.rcode == 0
+        assert str(reply.q.qname) == "MacBook-Pro.vpn.example.com."
+        assert len(reply.rr) == 1
+        assert str(reply.rr[0].rdata) == "10.8.0.5"
+        assert reply.rr[0].ttl == 60
+
+    def test_nxdomain(self, server):
+        query = DNSRecord.question("unknown.vpn.example.com")
+        reply = DNSRecord.parse(server.handle_request(query.pack(), ("127.0.0.1", 5353)))
+
+        assert reply.header.rcode == 3
+        assert reply.rr == []
+
+    def test_non_a_query(self, server):
+        query = DNSRecord.question("macbook-pro.vpn.example.com", "AAAA")
+        reply = DNSRecord.parse(server.handle_request(query.pack(), ("127.0.0.1", 5353)))
+
+        assert reply.q.qtype == QTYPE.AAAA
+        assert reply.header.rcode == 3
+
+    def test_a_reply_matches_dnslib(self, server):
+        query = DNSRecord.question("macbook-pro.vpn.example.com")
+        expected = query.reply()
+        expected.add_answer(RR(
+            rname=query.q.qname,
+            rtype=QTYPE.A,
+            rclass=1,
+            ttl=60,
+            rdata=A("10.8.0.5"),
+        ))
+
+        assert server.handle_request(query.pack(), ("127.0.0.1", 5353)) == expected.pack()
+
+    def test_nxdomain_matches_dnslib(self, server):
+        query = DNSRecord.question("unknown.vpn.example.com")
+        expected = query.reply()
+        expected.header.rcode = 3
+
+        assert server.handle_request(query.pack(), ("127.0.0.1", 5353)) == expected.pack()
+
+    def test_drops_additional_records(self, server):
+        query = DNSRecord.question("macbook-pro.vpn.example.com")
+        query.add_ar(RR("extra.example.com", rdata=A("1.2.3.4")))
+        reply = DNSRecord.parse(server.handle_request(query.pack(), ("127.0.0.1", 5353)))
+
+        assert reply.header.ar == 0
+        assert len(reply.rr) == 1
+
+    def test_multiple_questions_fallback(self, server):
+        query = DNSRecord.question("macbook-pro.vpn.example.com")
+        query.add_question(DNSRecord.question("other.vpn.example.com").q)
+        reply = DNSRecord.parse(server.handle_request(query.pack(), ("127.0.0.1", 5353)))
+
+        assert str(reply.rr[0].rdata) == "10.8.0.5"
+
+    def test_invalid_packet(self, server):
+        assert server.handle_request(b"\x00\x01", ("127.0.0.1", 5353)) == b""
+
+
+def _free_udp_port() -> int:
+    """向内核申请一个空闲的本地 UDP 端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _FlakySocket:
+    """首次 recvfrom 抛出 OSError 的伪 socket"""
+
+    def __init__(self, server, packet):
+        self.server = server
+        self.packet = packet
+        self.calls = 0
+        self.sent = []
+        self.closed = False
+
+    def recvfrom(self, size):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionRefusedError("port unreachable")
+        if self.calls == 2:
+            return self.packet, ("127.0.0.1", 5353)
+        self.server.running = False
+        raise OSError("shutdown")
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+
+    def close(self):
+        self.closed = True
+
+
+class TestServeLifecycle:
+    """测试 worker 收发循环与启停"""
+
+    def test_transient_error_keeps_serving(self, server):
+        query = DNSRecord.question("macbook-pro.vpn.example.com")
+        sock = _FlakySocket(server, query.pack())
+        server.running = True
+
+        server._serve_socket(sock)
+
+        assert sock.calls == 3
+        assert len(sock.sent) == 1
+        assert str(DNSRecord.parse(sock.sent[0][0]).rr[0].rdata) == "10.8.0.5"
+        assert sock.closed
+
+    def test_start_background_and_stop(self, temp_config_file):
+        port = _free_udp_port()
+        server = InternalDNSServer(
+            listen_address="127.0.0.1",
+            listen_port=port,
+            wg_config_path=temp_config_file,
+            workers=2,
+        )
+        server.start_background()
+        threads = list(server._threads)
+        try:
+            query = DNSRecord.question("macbook-pro.vpn.example.com")
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+                client.settimeout(2)
+                client.sendto(query.pack(), ("127.0.0.1", port))
+                reply = DNSRecord.parse(client.recv(512))
+            assert str(reply.rr[0].rdata) == "10.8.0.5"
+        finally:
+            server.stop()
+
+        assert not server.running
+        assert threads and not any(t.is_alive() for t in threads)
+        assert server._threads == []
@@ -0,0 +1,141 @@
+"""
+Tests for File IO Helpers
+"""
+
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from piercer.core import fileio
+from piercer.core.fileio import open_locked, open_locked_append, write_atomic
+
+
+class TestWriteAtomic:
+    """测试原子写入"""
+
+    def test_write_new_file(self, tmp_path):
+        path = tmp_path / "wg0.conf"
+        assert write_atomic(path, b"hello\n") is True
+        assert path.read_bytes() == b"hello\n"
+        assert not (tmp_path / "wg0.conf.tmp").exists()
+
+    def test_skip_unchanged(self, tmp_path):
+        path = tmp_path / "wg0.conf"
+        path.write_bytes(b"hello\n")
+        inode = os.stat(path).st_ino
+
+        assert write_atomic(path, b"hello\n") is False
+        assert os.stat(path).st_ino == inode
+
+    def test_replace_keeps_mode(self, tmp_path):
+        path = tmp_path / "wg0.conf"
+        path.write_bytes(b"old\n")
+        path.chmod(0o600)
+
+        assert write_atomic(path, b"new\n") is True
+        assert path.read_bytes() == b"new\n"
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    def test_temp_file_created_private(self, tmp_path, monkeypatch):
+        pytest.importorskip("fcntl")
+        path = tmp_path / "wg0.conf"
+        path.write_bytes(b"old\n")
+        path.chmod(0o644)
+
+        modes = []
+        real_fchmod = os.fchmod
+
+        def recording_fchmod(fd, mode):
+            modes.append(stat.S_IMODE(os.fstat(fd).st_mode))
+            real_fchmod(fd, mode)
+
+        monkeypatch.setattr(os, "fchmod", recording_fchmod)
+        old_umask = os.umask(0)
+        try:
+            write_atomic(path, b"new\n")
+        finally:
+            os.umask(old_umask)
+
+        assert modes == [0o600]
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+    def test_write_chunks(self, tmp_path):
+        path = tmp_path / "wg0.conf"
+        assert write_atomic(path, [b"head\n", b"", b"tail\n"]) is True
+        assert path.read_bytes() == b"head\ntail\n"
+        assert write_atomic(path, [b"head\n", b"tail\n"]) is False
+
+    def test_write_chunks_partial_writes(self, tmp_path, monkeypatch):
+        # 模拟每次只写出 3 字节的 writev
+        real_writev = os.writev
+        monkeypatch.setattr(os, "writev", lambda fd, bufs: real_writev(fd, [bytes(bufs[0][:3])]))
+
+        path = tmp_path / "wg0.conf"
+        write_atomic(path, [b"head\n", b"tail\n"])
+        assert path.read_bytes() == b"head\ntail\n"
+
+
+class TestIovMax:
+    """测试 writev 分段上限"""
+
+    @pytest.mark.parametrize("result", [-1, 0, ValueError("SC_IOV_MAX")])
+    def test_fallback(self, monkeypatch, result):
+        def fake_sysconf(name):
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        monkeypatch.setattr(os, "sysconf", fake_sysconf, raising=False)
+        assert fileio._iov_max() == 16
+
+    def test_single_chunk_with_unlimited_sysconf(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(os, "sysconf", lambda name: -1, raising=False)
+        monkeypatch.setattr(fileio, "_IOV_MAX", fileio._iov_max())
+
+        path = tmp_path / "wg0.conf"
+        assert write_atomic(path, b"hello\n") is True
+        assert path.read_bytes() == b"hello\n"
+
+
+class TestOpenLockedAppend:
+    """测试加锁追加"""
+
+    def test_read_then_append(self, tmp_path):
+        path = tmp_path / "wg0.conf"
+        path.write_bytes(b"head\n")
+
+        with open_locked_append(path) as f:
+            assert f.read() == b"head\n"
+            f.write(b"tail\n")
+
+        assert path.read_bytes() == b"head\ntail\n"
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            with open_locked_append(tmp_path / "wg0.conf"):
+                pass
+
+    def test_reopens_after_replace(self, tmp_path):
+        pytest.importorskip("fcntl")
+        path = tmp_path / "wg0.conf"
+        path.write_bytes(b"old\n")
+        started = threading.Event()
+
+        def append():
+            started.set()
+            with open_locked_append(path) as f:
+                f.write(b"added\n")
+
+        # 持锁改写期间发起的追加应写入替换后的新文件
+        with open_locked(path):
+            worker = threading.Thread(target=append)
+            worker.start()
+            started.wait()
+            time.sleep(0.1)
+            write_atomic(path, b"new\n")
+        worker.join(timeout=5)
+
+        assert path.read_bytes() == b"new\nadded\n"
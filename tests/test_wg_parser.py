@@ -3,14 +3,18 @@ Tests for WireGuard Parser
 """
 
 import pytest
+from dataclasses import FrozenInstanceError
 from datetime import date
 from pathlib import Path
-import tempfile
+import shutil
+import os
 
 from piercer.core.wg_parser import (
     WgParser,
     WgPeer,
     PEER_PATTERN,
+    iter_peer_blocks_with_endpoint,
+    iter_peer_records,
     generate_client_config_template,
 )
 
@@ -52,13 +56,11 @@ PresharedKey = PRESHARED_KEY_VALUE
 
 
 @pytest.fixture
-def temp_config_file():
-    """创建临时配置文件"""
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".conf", delete=False) as f:
-        f.write(SAMPLE_WG_CONFIG)
-        f.flush()
-        yield f.name
-    Path(f.name).unlink(missing_ok=True)
+def temp_config_file(golden_file, tmp_path):
+    """创建临时配置文件 (复制自样例)"""
+    dst = tmp_path / "wg0.conf"
+    shutil.copyfile(golden_file("wg0.conf", SAMPLE_WG_CONFIG), dst)
+    return str(dst)
 
 
 @pytest.fixture
@@ -71,18 +73,49 @@ class TestPeerPattern:
     """测试正则表达式"""
     
     def test_pattern_matches_peers(self):
-        matches = list(PEER_PATTERN.finditer(SAMPLE_WG_CONFIG))
+        matches = list(PEER_PATTERN.finditer(SAMPLE_WG_CONFIG.encode()))
         assert len(matches) == 3
     
     def test_pattern_extracts_name(self):
-        matches = list(PEER_PATTERN.finditer(SAMPLE_WG_CONFIG))
+        matches = list(PEER_PATTERN.finditer(SAMPLE_WG_CONFIG.encode()))
         names = [m.group(1).strip() for m in matches]
-        assert names == ["macbook-pro", "home-nas", "phone-android"]
+        assert names == [b"macbook-pro", b"home-nas", b"phone-android"]
     
     def test_pattern_extracts_date(self):
-        matches = list(PEER_PATTERN.finditer(SAMPLE_WG_CONFIG))
+        matches = list(PEER_PATTERN.finditer(SAMPLE_WG_CONFIG.encode()))
         dates = [m.group(2).strip() for m in matches]
-        assert dates == ["2026-01-27", "2026-01-27", "2026-01-28"]
+        assert dates == [b"2026-01-27", b"2026-01-27", b"2026-01-28"]
+    
+    def test_pattern_extracts_fields(self):
+        matches = list(PEER_PATTERN.finditer(SAMPLE_WG_CONFIG.encode()))
+        assert matches[1].group("pubkey") == b"CLIENT2_PUBLIC_KEY"
+        assert matches[1].group("ep") == b"nas.myhome.com:51820"
+        assert matches[2].group("psk") == b"PRESHARED_KEY_VALUE"
+        assert matches[0].group("ep") is None
+    
+    def test_pattern_stops_at_unmanaged_peer(self):
+        config = SAMPLE_WG_CONFIG + "\n[Peer]\nPublicKey = KEY_LEGACY\nAllowedIPs = 10.8.0.9/32\n"
+        match = list(PEER_PATTERN.finditer(config.encode()))[-1]
+        assert match.group("pubkey") == b"CLIENT3_PUBLIC_KEY"
+        assert match.group("ips") == b"10.8.0.7/32"
+    
+    def test_pattern_indented_fields(self):
+        config = SAMPLE_WG_CONFIG.replace(
+            "PublicKey = CLIENT1_PUBLIC_KEY\nAllowedIPs = 10.8.0.5/32",
+            "    PublicKey = CLIENT1_PUBLIC_KEY\n\tAllowedIPs = 10.8.0.5/32",
+        )
+        match = next(PEER_PATTERN.finditer(config.encode()))
+        assert match.group("pubkey") == b"CLIENT1_PUBLIC_KEY"
+        assert match.group("ips") == b"10.8.0.5/32"
+    
+    def test_pattern_field_order_independent(self):
+        config = SAMPLE_WG_CONFIG.replace(
+            "PublicKey = CLIENT1_PUBLIC_KEY\nAllowedIPs = 10.8.0.5/32",
+            "AllowedIPs = 10.8.0.5/32\nPersistentKeepalive = 25\nPublicKey = CLIENT1_PUBLIC_KEY",
+        )
+        match = next(PEER_PATTERN.finditer(config.encode()))
+        assert match.group("pubkey") == b"CLIENT1_PUBLIC_KEY"
+        assert match.group("ips") == b"10.8.0.5/32"
 
 
 class TestWgParser:
@@ -110,16 +143,133 @@ class TestWgParser:
         
         assert phone_peer.preshared_key == "PRESHARED_KEY_VALUE"
     
+    def test_parse_peers_trailing_unmanaged_peer(self, parser):
+        config = SAMPLE_WG_CONFIG + "\n[Peer]\nPublicKey = KEY_LEGACY\nAllowedIPs = 10.8.0.9/32\n"
+        peers = parser.parse_peers(config)
+        
+        assert [p.public_key for p in peers] == [
+            "CLIENT1_PUBLIC_KEY", "CLIENT2_PUBLIC_KEY", "CLIENT3_PUBLIC_KEY",
+        ]
+        assert peers[2].allowed_ips == "10.8.0.7/32"
+    
+    def test_parse_peers_immutable(self, parser):
+        peers = parser.parse_peers()
+        with pytest.raises(FrozenInstanceError):
+            peers[0].transfer_rx = 100
+        
+        peers.clear()
+        assert len(parser.parse_peers()) == 3
+    
+    def test_get_peer_index_without_peers(self, parser):
+        index = parser.get_peer_index("[Interface]\nAddress = 10.8.0.1/24\n")
+        
+        assert index.peers == []
+        assert index.by_name == {}
+    
+    def test_iter_peer_records(self):
+        records = list(iter_peer_records(SAMPLE_WG_CONFIG.encode()))
+        
+        assert [r[0] for r in records] == [b"macbook-pro", b"home-nas", b"phone-android"]
+        assert records[1][5] == b"nas.myhome.com:51820"
+        assert records[2][4] == b"PRESHARED_KEY_VALUE"
+    
+    def test_iter_peer_records_incomplete_headers(self):
+        data = b"# ==========\n# ClientName: x\n" * 10000 + b"# ClientName: " + b"y" * 10000
+        assert list(iter_peer_records(data)) == []
+    
+    def test_iter_peer_blocks_with_endpoint(self):
+        peers = list(iter_peer_blocks_with_endpoint(SAMPLE_WG_CONFIG.encode()))
+        
+        assert [p.name for p in peers] == ["home-nas"]
+        assert peers[0].endpoint == "nas.myhome.com:51820"
+    
+    def test_p2p_candidates_without_cached_index(self, parser, monkeypatch):
+        from piercer.core import wg_parser
+        
+        monkeypatch.setattr(wg_parser, "_PEER_INDEX_CACHE", {})
+        uncached = parser.get_p2p_candidates()
+        assert wg_parser._PEER_INDEX_CACHE == {}
+        
+        parser.get_peer_index()
+        assert parser.get_p2p_candidates() == uncached
+    
+    def test_p2p_candidates_cached_by_stat(self, parser, temp_config_file, monkeypatch):
+        candidates = parser.get_p2p_candidates()
+        monkeypatch.setattr(parser, "_read_config_bytes", None)
+        assert parser.get_p2p_candidates() == candidates
+        assert parser.get_p2p_candidates() is not parser.get_p2p_candidates()
+        
+        with open(temp_config_file, "a") as f:
+            f.write("# trailing comment\n")
+        monkeypatch.undo()
+        assert parser.get_p2p_candidates() == candidates
+    
+    def test_peer_index_eviction_tolerates_race(self, monkeypatch):
+        from piercer.core import wg_parser
+        
+        class RacyCache(dict):
+            """迭代时给出一个已被其他线程淘汰的键"""
+            def __iter__(self):
+                return iter([b"already-evicted"])
+        
+        cache = RacyCache((bytes([i]), None) for i in range(wg_parser._PEER_INDEX_CACHE_MAX))
+        monkeypatch.setattr(wg_parser, "_PEER_INDEX_CACHE", cache)
+        
+        index = wg_parser._parse_peer_index(SAMPLE_WG_CONFIG.encode())
+        assert len(index.peers) == 3
+    
+    def test_get_peer_index_cached_by_stat(self, parser, temp_config_file, monkeypatch):
+        from piercer.core import wg_parser
+        
+        index = parser.get_peer_index()
+        monkeypatch.setattr(wg_parser, "_parse_peer_index", None)
+        assert parser.get_peer_index() is index
+        
+        with open(temp_config_file, "a") as f:
+            f.write("# trailing comment\n")
+        monkeypatch.undo()
+        assert parser.get_peer_index() is not index
+    
+    def test_bytes_content_matches_str(self, parser):
+        data = SAMPLE_WG_CONFIG.encode()
+        
+        assert parser.parse_peers(data) == parser.parse_peers(SAMPLE_WG_CONFIG)
+        assert parser.get_p2p_candidates(data) == parser.get_p2p_candidates(SAMPLE_WG_CONFIG)
+        assert parser.get_used_ips(data) == parser.get_used_ips(SAMPLE_WG_CONFIG)
+        assert parser.check_name_conflict("home-nas", data)
+        assert parser.check_ip_conflict("10.8.0.5", data)
+    
+    def test_write_config_bytes(self, parser, temp_config_file):
+        parser.write_config(b"[Interface]\n")
+        assert Path(temp_config_file).read_bytes() == b"[Interface]\n"
+    
+    def test_get_peer_index_empty_file(self, tmp_path):
+        path = tmp_path / "wg0.conf"
+        path.write_bytes(b"")
+        
+        assert WgParser(str(path)).get_peer_index().peers == []
+    
+    def test_get_peer_index_from_file_matches_content(self, parser):
+        assert parser.get_peer_index() is parser.get_peer_index(SAMPLE_WG_CONFIG)
+    
+    def test_get_peer_index(self, parser):
+        index = parser.get_peer_index()
+        
+        assert [p.name for p in index.peers] == ["macbook-pro", "home-nas", "phone-android"]
+        assert index.by_name["home-nas"].public_key == "CLIENT2_PUBLIC_KEY"
+        assert index.by_pubkey["CLIENT3_PUBLIC_KEY"] == 2
+        assert [p.name for p in index.endpoints] == ["home-nas"]
+        assert index.used_ips == parser.get_used_ips()
+        assert parser.get_peer_index() is index
+        
+        with pytest.raises(FrozenInstanceError):
+            index.used_ips = 0
+    
     def test_get_used_ips(self, parser):
         used_ips = parser.get_used_ips()
         
         # 应包含服务器 IP 和三个客户端 IP
-        assert len(used_ips) == 4
-        from ipaddress import IPv4Address
-        assert IPv4Address("10.8.0.1") in used_ips
-        assert IPv4Address("10.8.0.5") in used_ips
-        assert IPv4Address("10.8.0.6") in used_ips
-        assert IPv4Address("10.8.0.7") in used_ips
+        assert used_ips == (1 << 1) | (1 << 5) | (1 << 6) | (1 << 7)
     
     def test_get_next_available_ip(self, parser):
         next_ip = parser.get_next_available_ip()
@@ -128,9 +278,21 @@ class TestWgParser:
         from ipaddress import IPv4Address
         assert next_ip == IPv4Address("10.8.0.2")
     
+    def test_get_next_available_ip_exhausted(self, parser):
+        content = "".join(f"AllowedIPs = 10.8.0.{i}/32\n" for i in range(2, 255))
+        with pytest.raises(RuntimeError, match="IP 地址池已耗尽"):
+            parser.get_next_available_ip(content)
+    
     def test_check_ip_conflict(self, parser):
         assert parser.check_ip_conflict("10.8.0.5") is True
         assert parser.check_ip_conflict("10.8.0.2") is False
+        assert parser.check_ip_conflict("10.8.0.6/32") is True
+        assert parser.check_ip_conflict("192.168.1.5") is False
+    
+    def test_check_ip_conflict_invalid(self, parser):
+        for ip in ("10.8.0.256", "10.8.0.05", "not-an-ip"):
+            with pytest.raises(ValueError, match="无效的 IP 地址"):
+                parser.check_ip_conflict(ip)
     
     def test_check_name_conflict(self, parser):
         assert parser.check_name_conflict("macbook-pro") is True
@@ -143,6 +305,44 @@ class TestWgParser:
         assert candidates[0].name == "home-nas"
         assert candidates[0].endpoint == "nas.myhome.com:51820"
     
+    def test_get_peers_with_status_cached(self, parser):
+        peers = parser.get_peers_with_status()
+        peers.clear()
+        assert len(parser.get_peers_with_status()) == 3
+        
+        parser.add_peer(
+            name="new-device",
+            public_key="NEW_PUBLIC_KEY",
+            assigned_ip="10.8.0.10",
+            added_at="2026-01-28",
+        )
+        assert len(parser.get_peers_with_status()) == 4
+    
+    def test_server_public_key_cached(self, parser, monkeypatch):
+        import subprocess
+        from piercer.core import wg_parser
+        
+        calls = []
+        
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, stdout="SERVER_PUBLIC_KEY\n")
+        
+        monkeypatch.setattr(wg_parser.subprocess, "run", fake_run)
+        assert parser.get_server_public_key() == "SERVER_PUBLIC_KEY"
+        assert parser.get_server_public_key() == "SERVER_PUBLIC_KEY"
+        assert len(calls) == 1
+    
+    def test_server_public_key_placeholder_not_cached(self, parser, monkeypatch):
+        from piercer.core import wg_parser
+        
+        def missing_wg(cmd, **kwargs):
+            raise FileNotFoundError(cmd[0])
+        
+        monkeypatch.setattr(wg_parser.subprocess, "run", missing_wg)
+        assert parser.get_server_public_key() == "<SERVER_PUBLIC_KEY>"
+        assert "server_public_key" not in parser._cache
+    
     def test_generate_peer_block(self, parser):
         block = parser.generate_peer_block(
             name="test-device",
@@ -173,6 +373,37 @@ class TestWgParser:
         new_peer = next(p for p in peers if p.name == "new-device")
         assert new_peer.public_key == "NEW_PUBLIC_KEY"
     
+    def test_add_peer_appends_in_place(self, parser, temp_config_file):
+        inode = os.stat(temp_config_file).st_ino
+        parser.add_peer(
+            name="new-device",
+            public_key="NEW_PUBLIC_KEY",
+            assigned_ip="10.8.0.10",
+            added_at="2026-01-28",
+        )
+        
+        content = Path(temp_config_file).read_text()
+        assert os.stat(temp_config_file).st_ino == inode
+        assert content.startswith(SAMPLE_WG_CONFIG)
+        assert content.endswith("AllowedIPs = 10.8.0.10/32\n")
+    
+    def test_add_peer_missing_file(self):
+        parser = WgParser("/nonexistent/wg0.conf")
+        with pytest.raises(FileNotFoundError):
+            parser.add_peer(
+                name="new-device",
+                public_key="NEW_PUBLIC_KEY",
+                assigned_ip="10.8.0.10",
+                added_at="2026-01-28",
+            )
+    
+    def test_indented_allowed_ips_conflict(self, parser):
+        from ipaddress import IPv4Address
+        config = SAMPLE_WG_CONFIG + "\n[Peer]\nPublicKey = KEY_LEGACY\n    AllowedIPs = 10.8.0.3/32\n"
+        
+        assert parser.check_ip_conflict("10.8.0.3", config)
+        assert parser.get_next_available_ip(config) != IPv4Address("10.8.0.3")
+    
     def test_add_peer_name_conflict(self, parser):
         with pytest.raises(ValueError, match="设备名称已存在"):
             parser.add_peer(
@@ -199,11 +430,248 @@ class TestWgParser:
         assert len(peers) == 2
         assert not any(p.name == "macbook-pro" for p in peers)
     
+    def test_remove_peer_content(self, parser, temp_config_file):
+        parser.remove_peer("home-nas")
+        
+        content = Path(temp_config_file).read_text()
+        assert "home-nas" not in content
+        assert "CLIENT2_PUBLIC_KEY" not in content
+        assert "# ClientName: macbook-pro" in content
+        assert content.endswith("PresharedKey = PRESHARED_KEY_VALUE\n")
+    
+    def test_remove_peer_keeps_trailing_unmanaged_peer(self, parser, temp_config_file):
+        legacy = "\n[Peer]\nPublicKey = KEY_LEGACY\nAllowedIPs = 10.8.0.9/32\n"
+        Path(temp_config_file).write_text(SAMPLE_WG_CONFIG + legacy)
+        
+        assert parser.remove_peer("phone-android")
+        
+        content = Path(temp_config_file).read_text()
+        assert "CLIENT3_PUBLIC_KEY" not in content
+        assert "PublicKey = KEY_LEGACY\nAllowedIPs = 10.8.0.9/32\n" in content
+        assert "# ClientName: home-nas" in content
+    
+    def test_remove_and_add_concurrently(self, parser, temp_config_file):
+        import threading
+        
+        def add():
+            parser.add_peer(
+                name="new-device",
+                public_key="NEW_PUBLIC_KEY",
+                assigned_ip="10.8.0.10",
+                added_at="2026-01-28",
+            )
+        
+        workers = [
+            threading.Thread(target=parser.remove_peer, args=("home-nas",)),
+            threading.Thread(target=add),
+        ]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join(timeout=5)
+        
+        names = [p.name for p in WgParser(temp_config_file).parse_peers()]
+        assert names == ["macbook-pro", "phone-android", "new-device"]
+    
     def test_remove_peer_not_found(self, parser):
         result = parser.remove_peer("nonexistent")
         assert result is False
 
 
+class _FakeNla(dict):
+    """模拟 pyroute2 的 netlink 属性对象"""
+    
+    def get_attr(self, name):
+        return self.get(name)
+
+
+class TestNetlinkStatus:
+    """测试 netlink 运行时状态转换"""
+    
+    def test_runtime_status_from_netlink(self):
+        from base64 import b64encode
+        from piercer.core.wg_parser import _netlink_runtime_status
+        
+        peer_key = b64encode(b"\x01" * 32)
+        device = _FakeNla(WGDEVICE_A_PEERS=[_FakeNla(
+            WGPEER_A_PUBLIC_KEY=peer_key,
+            WGPEER_A_PRESHARED_KEY=b64encode(bytes(32)),
+            WGPEER_A_ENDPOINT={"addr": "1.2.3.4", "port": 51820},
+            WGPEER_A_LAST_HANDSHAKE_TIME={"tv_sec": 1700000000, "tv_nsec": 0},
+            WGPEER_A_RX_BYTES=100,
+            WGPEER_A_TX_BYTES=200,
+            WGPEER_A_ALLOWEDIPS=[{"addr": "10.8.0.5/32"}],
+        )])
+        
+        status = _netlink_runtime_status([device])
+        info = status[peer_key.decode()]
+        assert info["preshared_key"] is None
+        assert info["endpoint"] == "1.2.3.4:51820"
+        assert info["allowed_ips"] == "10.8.0.5/32"
+        assert info["latest_handshake"] == 1700000000
+        assert info["transfer_rx"] == 100
+        assert info["transfer_tx"] == 200
+        assert info["persistent_keepalive"] is None
+    
+    def test_runtime_status_merges_messages(self):
+        from base64 import b64encode
+        from piercer.core.wg_parser import _netlink_runtime_status
+        
+        keys = [b64encode(bytes([i]) * 32) for i in (1, 2)]
+        messages = [
+            _FakeNla(WGDEVICE_A_PEERS=[_FakeNla(WGPEER_A_PUBLIC_KEY=keys[0], WGPEER_A_RX_BYTES=1)]),
+            _FakeNla(WGDEVICE_A_PEERS=[_FakeNla(WGPEER_A_PUBLIC_KEY=keys[1], WGPEER_A_RX_BYTES=2)]),
+        ]
+        
+        status = _netlink_runtime_status(messages)
+        assert status[keys[1].decode()]["transfer_rx"] == 2
+        assert len(status) == 2
+    
+    def test_netlink_handle_shared(self, monkeypatch):
+        import sys
+        import types
+        from piercer.core import wg_parser
+        
+        created = []
+        
+        class FakeWireGuard:
+            def __init__(self):
+                created.append(self)
+            
+            def info(self, interface):
+                return iter([_FakeNla(WGDEVICE_A_PEERS=[]), _FakeNla(WGDEVICE_A_PEERS=[])])
+        
+        monkeypatch.setitem(sys.modules, "pyroute2", types.SimpleNamespace(WireGuard=FakeWireGuard))
+        monkeypatch.setattr(wg_parser, "_nl_handle", None)
+        
+        for _ in range(3):
+            parser = WgParser("/nonexistent/wg0.conf", use_netlink=True)
+            assert len(parser._netlink_messages()) == 2
+        assert len(created) == 1
+
+
+SAMPLE_WG_DUMP = (
+    "SERVER_PRIVATE_KEY\tSERVER_PUBLIC_KEY\t51820\toff\n"
+    "CLIENT1_PUBLIC_KEY\t(none)\t1.2.3.4:51820\t10.8.0.5/32\t1700000000\t100\t200\toff\n"
+    "CLIENT3_PUBLIC_KEY\tPSK\t(none)\t10.8.0.7/32\t0\t0\t0\t25\n"
+)
+
+
+class TestWgShowDump:
+    """测试 wg show dump 输出解析"""
+    
+    @pytest.fixture
+    def fake_dump(self, monkeypatch):
+        import sys
+        from piercer.core import wg_parser
+        
+        cmd = (sys.executable, "-c", f"import sys; sys.stdout.write({SAMPLE_WG_DUMP!r})")
+        monkeypatch.setattr(wg_parser, "_WG_DUMP_CMD", cmd)
+    
+    def test_runtime_status(self, parser, fake_dump):
+        status = parser.get_runtime_status()
+        
+        assert set(status) == {"CLIENT1_PUBLIC_KEY", "CLIENT3_PUBLIC_KEY"}
+        assert status["CLIENT1_PUBLIC_KEY"]["latest_handshake"] == 1700000000
+        assert status["CLIENT1_PUBLIC_KEY"]["preshared_key"] is None
+        assert status["CLIENT3_PUBLIC_KEY"]["latest_handshake"] is None
+        assert status["CLIENT3_PUBLIC_KEY"]["persistent_keepalive"] == "25"
+    
+    def test_runtime_status_async_matches_sync(self, parser, fake_dump):
+        import asyncio
+        assert asyncio.run(parser.get_runtime_status_async()) == parser.get_runtime_status()
+    
+    def test_peers_with_status_async(self, parser, fake_dump):
+        import asyncio
+        peers = asyncio.run(parser.get_peers_with_status_async())
+        
+        assert peers[0].transfer_rx == 100
+        assert peers[1].transfer_rx is None
+        assert peers[2].transfer_tx == 0
+    
+    def test_async_malformed_dump_reaps_process(self, parser, monkeypatch):
+        import asyncio
+        import sys
+        from piercer.core import wg_parser
+        
+        bad = "IFACE\tK\t1\toff\nKEY\t(none)\t(none)\t10.8.0.5/32\t0\tNaN\t0\toff\n"
+        cmd = (sys.executable, "-c", f"import sys; sys.stdout.write({bad!r})")
+        monkeypatch.setattr(wg_parser, "_WG_DUMP_CMD", cmd)
+        
+        procs = []
+        spawn = asyncio.create_subprocess_exec
+        
+        async def recording_spawn(*args, **kwargs):
+            proc = await spawn(*args, **kwargs)
+            procs.append(proc)
+            return proc
+        
+        monkeypatch.setattr(wg_parser.asyncio, "create_subprocess_exec", recording_spawn)
+        with pytest.raises(ValueError):
+            asyncio.run(parser.get_runtime_status_async())
+        assert procs[0].returncode is not None
+    
+    def test_async_netlink_off_loop(self, monkeypatch):
+        import asyncio
+        import threading
+        
+        parser = WgParser("/nonexistent/wg0.conf", use_netlink=True)
+        threads = []
+        
+        def fake_messages(interface="wg0"):
+            threads.append(threading.current_thread())
+            return [_FakeNla(WGDEVICE_A_PEERS=[])]
+        
+        monkeypatch.setattr(parser, "_netlink_messages", fake_messages)
+        assert asyncio.run(parser.get_runtime_status_async()) == {}
+        assert threads[0] is not threading.main_thread()
+    
+    def test_missing_wg_command(self, parser, monkeypatch):
+        import asyncio
+        from piercer.core import wg_parser
+        
+        monkeypatch.setattr(wg_parser, "_WG_DUMP_CMD", ("/nonexistent/wg", "show"))
+        assert parser.get_runtime_status() == {}
+        assert asyncio.run(parser.get_runtime_status_async()) == {}
+
+
+class TestReload:
+    """测试热重载"""
+    
+    def test_reload_uses_stdin(self, monkeypatch):
+        import subprocess
+        from piercer.core import wg_parser
+        
+        calls = []
+        
+        def fake_run(cmd, **kwargs):
+            calls.append((cmd, kwargs.get("input")))
+            return subprocess.CompletedProcess(cmd, 0, stdout=b"[Interface]\n")
+        
+        monkeypatch.setattr(wg_parser.subprocess, "run", fake_run)
+        assert wg_parser.reload_wg("wg0") is True
+        assert calls[1] == (["wg", "syncconf", "wg0", "/dev/stdin"], b"[Interface]\n")
+    
+    def test_burst_requests_reload_once(self, monkeypatch):
+        import threading
+        from piercer.core import wg_parser
+        
+        calls = []
+        done = threading.Event()
+        
+        def fake_reload(interface):
+            calls.append(interface)
+            done.set()
+        
+        monkeypatch.setattr(wg_parser, "reload_wg", fake_reload)
+        monkeypatch.setattr(wg_parser, "_RELOAD_DEBOUNCE_SECONDS", 0.05)
+        for _ in range(5):
+            wg_parser.request_reload("wg0")
+        
+        assert done.wait(timeout=5)
+        assert calls == ["wg0"]
+
+
 class TestClientConfigTemplate:
     """测试客户端配置模板生成"""
     